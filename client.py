@@ -1,15 +1,36 @@
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from exchange.binance_client import BinanceClient
 from exchange.bybit_client import BybitClient
 
+
+def _ensure_logging():
+    """
+    Configure INFO-level logging unless the application has already set up its own handlers.
+    """
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO)
+        # urllib3 logs every connection at DEBUG; keep it quiet even if the root level is lowered later
+        logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+
 class TradingClient:
-    def __init__(self, testnet=True):
+    def __init__(self, testnet=True, price_ttl=0.25, quote_ttl=0.25, symbol_ttls=None):
         """
         Initialize the trading client that connects to Binance and Bybit.
+        `price_ttl` is how long (in seconds) each exchange client may serve a cached price.
+        `symbol_ttls` optionally overrides `price_ttl` per symbol, as a dict mapping symbols to seconds.
+        `quote_ttl` is how long (in seconds) place_order may route on the prices seen by the last get_best_price call.
         """
-        self.binance_client = BinanceClient(testnet=testnet)
-        self.bybit_client = BybitClient(testnet=testnet)
-        logging.basicConfig(level=logging.INFO)
+        self.binance_client = BinanceClient(testnet=testnet, price_ttl=price_ttl, symbol_ttls=symbol_ttls)
+        self.bybit_client = BybitClient(testnet=testnet, price_ttl=price_ttl, symbol_ttls=symbol_ttls)
+        self.quote_ttl = quote_ttl
+        # (symbol, binance_price, bybit_price, monotonic timestamp) from the last get_best_price call
+        self._last_quotes = None
+        # Two workers so both exchanges can be queried at the same time
+        self._executor = ThreadPoolExecutor(max_workers=2)
+        _ensure_logging()
 
     def get_best_price(self, symbol='BTCUSDT', price_type='lowest'):
         """
@@ -20,42 +41,74 @@ class TradingClient:
         :return: A tuple of the best price and the best exchange.
         """
         try:
+            if price_type not in ('lowest', 'highest'):
+                raise ValueError("Invalid price_type. Use 'lowest' or 'highest'.")
+
+            # Query both exchanges concurrently so the wait is the slower of the two round trips, not their sum
+            binance_future = self._executor.submit(self.binance_client.get_btcusdt_price)
+            bybit_future = self._executor.submit(self.bybit_client.get_price, symbol)
+
             # Get the Binance price as a float
-            binance_price = float(self.binance_client.get_btcusdt_price())
+            binance_price = float(binance_future.result())
             
             # Attempt to retrieve and convert Bybit price
-            bybit_price_data = self.bybit_client.get_price(symbol)
+            bybit_price_data = bybit_future.result()
             bybit_price = (
                 float(bybit_price_data['result']['list'][0]['lastPrice'])
                 if 'result' in bybit_price_data and bybit_price_data['result']['list'][0]['lastPrice'] is not None
                 else None
             )
             
-            # Determine the best price based on price_type
-            if price_type == 'lowest':
-                best_price, best_exchange = min(
-                    (price, name) for price, name in [(binance_price, 'Binance'), (bybit_price, 'Bybit')] if price is not None
-                )
-            elif price_type == 'highest':
-                best_price, best_exchange = max(
-                    (price, name) for price, name in [(binance_price, 'Binance'), (bybit_price, 'Bybit')] if price is not None
-                )
-            else:
-                raise ValueError("Invalid price_type. Use 'lowest' or 'highest'.")
-            
-            return best_price, best_exchange
+            self._last_quotes = (symbol, binance_price, bybit_price, time.monotonic())
+            return self._select_best(binance_price, bybit_price, price_type)
 
         except Exception as e:
-            logging.error(f"Error fetching prices: {e}")
+            logging.error("Error fetching prices: %s", e)
             raise
 
-    def place_order(self, side, quantity, symbol='BTCUSDT', exchange=None):
+    @staticmethod
+    def _select_best(binance_price, bybit_price, price_type):
+        """
+        Pick the best (price, exchange) pair from already known prices. A missing price on one exchange selects
+        the other one; with no price at all a ValueError is raised.
+        """
+        if binance_price is None and bybit_price is None:
+            raise ValueError("No price available from Binance or Bybit.")
+        # Determine the best price based on price_type with two plain float compares.
+        # Ties go to Binance for 'lowest' and to Bybit for 'highest'.
+        if bybit_price is None:
+            return binance_price, 'Binance'
+        if binance_price is None:
+            return bybit_price, 'Bybit'
+        if price_type == 'lowest':
+            return (binance_price, 'Binance') if binance_price <= bybit_price else (bybit_price, 'Bybit')
+        return (binance_price, 'Binance') if binance_price > bybit_price else (bybit_price, 'Bybit')
+
+    def _route(self, symbol, price_type, hint_prices=None):
+        """
+        Choose the exchange for an order without a round trip when possible: from `hint_prices`,
+        then from the quotes of a get_best_price call less than `quote_ttl` seconds old, and only then
+        by fetching fresh prices.
+        """
+        if hint_prices is not None:
+            binance_price, bybit_price = hint_prices
+            return self._select_best(binance_price, bybit_price, price_type)[1]
+
+        quotes = self._last_quotes
+        if quotes is not None and quotes[0] == symbol and time.monotonic() - quotes[3] < self.quote_ttl:
+            return self._select_best(quotes[1], quotes[2], price_type)[1]
+
+        return self.get_best_price(symbol, price_type=price_type)[1]
+
+    def place_order(self, side, quantity, symbol='BTCUSDT', exchange=None, hint_prices=None):
         """
         Place a market order on the specified exchange.
         :param side: 'Buy' or 'Sell' order side.
         :param quantity: Quantity to buy or sell.
         :param symbol: The trading symbol (default is BTC/USDT).
         :param exchange: The exchange to place the order. If None, it will determine the best exchange.
+        :param hint_prices: Optional (binance_price, bybit_price) tuple from a caller that already has live prices.
+                            Used to pick the exchange when `exchange` is None instead of fetching prices.
         :return: The order details.
         """
         try:
@@ -64,9 +117,9 @@ class TradingClient:
 
             if exchange is None:
                 if side.lower() == 'buy':
-                    _, exchange = self.get_best_price(symbol, price_type='lowest')
+                    exchange = self._route(symbol, 'lowest', hint_prices)
                 elif side.lower() == 'sell':
-                    _, exchange = self.get_best_price(symbol, price_type='highest')
+                    exchange = self._route(symbol, 'highest', hint_prices)
                 else:
                     raise ValueError("Invalid side. Side must be either 'Buy' or 'Sell'.")
 
@@ -77,16 +130,97 @@ class TradingClient:
             else:
                 raise ValueError("Invalid exchange name. Use 'Binance' or 'Bybit'.")
 
-            logging.info(f"Order placed successfully on {exchange}: {order}")
+            logging.info("Order placed successfully on %s: %s", exchange, order)
             return order
 
         except Exception as e:
-            logging.error(f"Error placing order on {exchange}: {e}")
+            logging.error("Error placing order on %s: %s", exchange, e)
             raise
 
+    def place_synchronized(self, side, quantity, execute_at, symbol='BTCUSDT'):
+        """
+        Place the same market order on both exchanges so that both orders reach the exchanges at wall-clock time `execute_at`.
+        Each order is sent early by half of that exchange's estimated round-trip time (see the exchange clients' `rtt`).
+        :param side: 'Buy' or 'Sell' order side.
+        :param quantity: Quantity to buy or sell on each exchange.
+        :param execute_at: UNIX time in seconds at which both orders should arrive.
+        :param symbol: The trading symbol (default is BTC/USDT).
+        :return: A dict with the order details from each exchange, keyed by exchange name.
+        """
+        if side not in ['Buy', 'Sell']:
+            raise ValueError("Invalid side. Side must be either 'Buy' or 'Sell'.")
+
+        # The legs sleep until their send time, so they run on threads of their own: the shared pool stays free for
+        # get_best_price and warm_up, and overlapping synchronized orders never queue behind each other
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = {
+                'Binance': executor.submit(self._place_order_at, self.binance_client, execute_at, symbol, side, quantity),
+                'Bybit': executor.submit(self._place_order_at, self.bybit_client, execute_at, symbol, side, quantity)
+            }
+
+            # Wait for both legs before reporting, so a failure on one side never hides the order placed on the other
+            orders = {}
+            errors = []
+            for exchange, future in futures.items():
+                try:
+                    orders[exchange] = future.result()
+                    logging.info("Synchronized order placed successfully on %s: %s", exchange, orders[exchange])
+                except Exception as e:
+                    logging.error("Error placing synchronized order on %s: %s", exchange, e)
+                    errors.append(e)
+
+        if errors:
+            raise errors[0]
+        return orders
+
+    def _place_order_at(self, exchange_client, execute_at, symbol, side, quantity):
+        """
+        Sleep until half a round trip before `execute_at`, then place the order on `exchange_client`.
+        """
+        one_way = (exchange_client.rtt or 0.0) / 2
+        delay = execute_at - time.time() - one_way
+        if delay > 0:
+            time.sleep(delay)
+        return exchange_client.place_order(symbol, side, quantity)
+
+    def start_tickers(self, symbol='BTCUSDT', max_age=2.0):
+        """
+        Subscribe to the WebSocket ticker streams of both exchanges so get_best_price answers from memory.
+        :param symbol: The trading symbol (default is BTC/USDT).
+        :param max_age: Seconds after which a streamed price is stale and a REST request is made instead.
+        """
+        self.binance_client.start_ticker(max_age=max_age)
+        self.bybit_client.start_ticker(symbol, max_age=max_age)
+
+    def warm_up(self):
+        """
+        Open the connections to both exchanges ahead of time so the first order does not pay for the TLS handshake,
+        and start keeping request timestamps in sync with the exchange clocks.
+        """
+        futures = [
+            self._executor.submit(self.binance_client.ping),
+            self._executor.submit(self.bybit_client.ping)
+        ]
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """
+        Close the price streams, stop the clock sync and worker threads, then close the HTTP sessions held by the
+        exchange clients.
+        """
+        self.binance_client.stop_tickers()
+        self.bybit_client.stop_tickers()
+        self.binance_client.stop_time_sync()
+        self.bybit_client.stop_time_sync()
+        self._executor.shutdown(wait=False)
+        self.binance_client.session.close()
+        self.bybit_client.session.close()
+
 # Example usage
 if __name__ == "__main__":
     trading_client = TradingClient(testnet=True)
+    # trading_client.warm_up()
 
     # Get the highest price and best exchange for selling BTC/USDT
     # highest_price, highest_price_exchange = trading_client.get_best_price(price_type='highest')
@@ -113,4 +247,8 @@ if __name__ == "__main__":
     # print(f"Order placed: {order}")
 
     # order = trading_client.place_order('Sell', 0.001,exchange='Bybit')
-    # print(f"Order placed: {order}")
\ No newline at end of file
+    # print(f"Order placed: {order}")
+
+    # Buy 0.001 BTC on both exchanges so that both orders arrive two seconds from now
+    # orders = trading_client.place_synchronized('Buy', 0.001, execute_at=time.time() + 2)
+    # print(f"Orders placed: {orders}")
\ No newline at end of file
@@ -0,0 +1,5 @@
+from dotenv import load_dotenv
+
+# Parse the .env file once per process instead of in every client constructor. The clients still read
+# the values from os.environ when they are created, so variables set in the environment later take effect.
+load_dotenv()
@@ -1,22 +1,56 @@
 import os
-import time
+import re
+import asyncio
+import json
 import base64
+import functools
 import requests
 import logging
-from dotenv import load_dotenv
+from exchange import _config  # noqa: F401  (loads the .env file once)
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
 from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 from cryptography.hazmat.primitives import hashes
+from exchange.utils import ExchangeClient, ttl_cache
 
 
+# Binance error -1100 names the rejected parameter; compiled once because errors can arrive in bursts
+_ILLEGAL_CHARS_RE = re.compile(r"Illegal characters found in parameter '(\w+)'")
 
-class BinanceClient:
-    def __init__(self, testnet=True):
+
+def _parse_ticker_event(message):
+    """
+    Last price of a 24hr ticker stream event, or None for any other message.
+    """
+    if message.get('e') != '24hrTicker':
+        return None
+    return float(message['c'])
+
+
+# Parsed private keys are shared by every BinanceClient loading the same file with the same password.
+# cryptography's key objects can sign from several threads at once, so sharing them is safe.
+# Failed loads raise and are therefore never cached.
+@functools.lru_cache(maxsize=4)
+def _load_private_key(path, password):
+    """
+    Load and decrypt the PEM private key at `path`, reusing the parsed key if it was loaded before.
+    """
+    with open(path, 'rb') as f:
+        return load_pem_private_key(data=f.read(), password=password)
+
+
+class BinanceClient(ExchangeClient):
+    NAME = 'Binance'
+    PING_ENDPOINT = "/api/v3/ping"
+
+    def __init__(self, testnet=True, price_ttl=0.25, timeout=(1.0, 3.0), symbol_ttls=None):
         """
         Initialize the Binance Client using API key and private key from provided environment variables.
         If `testnet=True`, it will use the Binance Testnet endpoint.
+        Prices are cached in memory for `price_ttl` seconds to absorb bursts of identical lookups.
+        `symbol_ttls` optionally maps symbols to their own cache TTL in seconds, e.g. {'BTCUSDT': 0.1}.
+        `timeout` is the (connect, read) timeout in seconds applied to every request.
         """
-        load_dotenv()  # Load environment variables from the .env file
         self.api_key = os.getenv("BINANCE_TESTNET_API_KEY")
         base_path = os.path.dirname(os.path.abspath(__file__))
         self.private_key_path = os.path.join(base_path, 'test-prv-key.pem')
@@ -32,113 +66,164 @@ class BinanceClient:
         if not self.original_private_key_password:
             raise ValueError("Private key password must be set in the .env file")
 
-        # Load the private key (assuming it's not password-protected)
-        try:
-            # Load the private key (assuming it's not password-protected)
-            with open(self.private_key_path, 'rb') as f:
-                self.private_key = load_pem_private_key(data=f.read(), password=self.private_key_password)
-        except FileNotFoundError:
+        if not os.path.isfile(self.private_key_path):
             raise ValueError(f"Private key file not found at {self.private_key_path}")
+
+        # Load and decrypt the password-protected private key
+        try:
+            self.private_key = _load_private_key(self.private_key_path, self.private_key_password)
         except Exception as e:
             raise ValueError(f"Error loading private key: {e}")
 
         # Set the appropriate base URL depending on whether it's testnet or mainnet
         if testnet:
             self.BASE_URL = "https://testnet.binance.vision"
+            self.STREAM_URL = "wss://stream.testnet.binance.vision/ws"
         else:
             self.BASE_URL = "https://api.binance.com"
+            self.STREAM_URL = "wss://stream.binance.com:9443/ws"
+
+        # The API key header never changes, so the session sends it with every request
+        super().__init__(self.BASE_URL, "/api/v3/order", {'X-MBX-APIKEY': self.api_key}, price_ttl, timeout,
+                         symbol_ttls)
 
-    def _sign_request(self, params):
+    def _fetch_server_time(self):
         """
-        Sign the request using the private key and return the base64-encoded signature.
+        Request the Binance server time in milliseconds.
         """
+        endpoint = "/api/v3/time"
         try:
-            # Create the payload string to be signed
-            payload = '&'.join([f'{param}={value}' for param, value in params.items()])
+            data = self._send_request('GET', endpoint)
+            return int(data['serverTime'])
+        except Exception as e:
+            logging.error("Error syncing Binance server time: %s", e)
+            raise
 
-            # Sign the request using the private key with PKCS1v15 padding and SHA256 hashing algorithm
-            signature = self.private_key.sign(
-                payload.encode('ASCII'),
-                padding.PKCS1v15(),  # Use padding.PSS() if required by the API
-                hashes.SHA256()
-            )
+    def _sign_request(self, payload_bytes):
+        """
+        Sign the ASCII-encoded query string using the private key and return the base64-encoded signature.
+        Both Ed25519 and RSA keys are supported; Ed25519 signs orders far faster than RSA.
+        """
+        try:
+            if isinstance(self.private_key, Ed25519PrivateKey):
+                # Ed25519 hashes internally, so it takes no padding or hash arguments
+                signature = self.private_key.sign(payload_bytes)
+            else:
+                # Sign the request using the private key with PKCS1v15 padding and SHA256 hashing algorithm
+                signature = self.private_key.sign(
+                    payload_bytes,
+                    padding.PKCS1v15(),  # Use padding.PSS() if required by the API
+                    hashes.SHA256()
+                )
 
             # Base64 encode the signature and return it
             return base64.b64encode(signature).decode()
         except Exception as e:
-            logging.error(f"Error signing request for _sign_request function : {e}")
+            logging.error("Error signing request for _sign_request function : %s", e)
             raise
-            
 
     def _send_request(self, method, endpoint, params=None):
         """
         Send HTTP request to the Binance API.
         """
         url = f"{self.BASE_URL}{endpoint}"
-        headers = {
-            'X-MBX-APIKEY': self.api_key
-        }
+        # GET parameters go into the query string, POST parameters into the form-encoded body
+        payload = {'params': params} if method == 'GET' else {'data': params}
 
         try:
-            if method == 'POST':
-                response = requests.post(url, headers=headers, data=params)
-            elif method == 'GET':
-                response = requests.get(url, headers=headers, params=params)
-            
-            response.raise_for_status()  # Raise an HTTPError for bad responses
-            return response.json()
-        except requests.exceptions.Timeout:
-            logging.error("Request timed out for _send_request function")
-            raise
-        except requests.exceptions.ConnectionError:
-            logging.error("Network connection error for _send_request function")
-            raise
+            return self._guarded_request(method, url, **payload)
         except requests.exceptions.HTTPError as e:
-            logging.error(f"HTTPError for _send_request function: {e.response.status_code} - {e.response.text}")
-            raise
-        except Exception as e:
-            logging.error(f"Error in request for _send_request function: {e}")
+            match = _ILLEGAL_CHARS_RE.search(e.response.text)
+            if match:
+                logging.error("Rejected parameter for _send_request function: %s", match.group(1))
             raise
 
     def place_order(self, symbol, side, quantity):
         """
         Place a market or limit order (buy/sell) for the specified symbol and quantity.
         """
+        # Wait for the order rate limit before taking the timestamp so it is fresh when sent
+        self._order_bucket.acquire()
+
         endpoint = "/api/v3/order"
+        side = side.upper()
+        timestamp = self._timestamp()  # UNIX timestamp in milliseconds
         params = {
             'symbol': symbol,
-            'side': side.upper(),
+            'side': side,
             'type': "MARKET",
             'quantity': quantity,
-            'timestamp': int(time.time() * 1000)  # UNIX timestamp in milliseconds
+            'timestamp': timestamp
         }
 
+        # The order parameters have a fixed shape, so build the signed query string directly
+        payload = f"symbol={symbol}&side={side}&type=MARKET&quantity={quantity}&timestamp={timestamp}"
+
         # Sign the request
         try:
-            params['signature'] = self._sign_request(params)
+            params['signature'] = self._sign_request(payload.encode('ASCII'))
         except Exception as e:
-            logging.error(f"Error signing order request for place_order function: {e}")
+            logging.error("Error signing order request for place_order function: %s", e)
             raise
 
         try:
             order = self._send_request('POST', endpoint, params=params)
-            logging.info(f"Order placed successfully for place_order function: {order}")
+            logging.info("Order placed successfully for place_order function: %s", order)
             return order
         except Exception as e:
-            logging.error(f"Error placing order for place_order function: {e}")
+            logging.error("Error placing order for place_order function: %s", e)
             raise
 
+    def start_ticker(self, max_age=2.0):
+        """
+        Subscribe to the BTC/USDT ticker stream so get_btcusdt_price can answer from memory instead of a REST request.
+        Falls back to a REST request whenever the stream has not delivered a price for `max_age` seconds.
+        """
+        # The server pings every few minutes and websocket-client answers with a pong, so no heartbeat is needed
+        self._start_ticker('BTCUSDT', f"{self.STREAM_URL}/btcusdt@ticker", _parse_ticker_event, max_age=max_age)
+
+    @ttl_cache(symbol='BTCUSDT')
     def get_btcusdt_price(self):
         """
         Get the current market price of the BTC/USDT pair.
         """
+        price = self._streamed_price('BTCUSDT')
+        if price is not None:
+            return price
+        return self._fetch_btcusdt_price()
+
+    async def get_btcusdt_price_async(self):
+        """
+        Async variant of get_btcusdt_price; the lookup runs in a worker thread.
+        """
+        return await asyncio.to_thread(self.get_btcusdt_price)
+
+    def _fetch_btcusdt_price(self):
+        """
+        Request the current BTC/USDT price from the REST API.
+        """
         endpoint = "/api/v3/ticker/price"
         params = {'symbol': 'BTCUSDT'}
         try:
             data = self._send_request('GET', endpoint, params)
             return float(data['price'])
         except Exception as e:
-            logging.error(f"Error fetching BTC/USDT price: {e}")
+            logging.error("Error fetching BTC/USDT price: %s", e)
+            raise
+
+    def get_prices(self, symbols):
+        """
+        Get the current market prices of several symbols with a single request.
+        Returns a dict mapping each symbol to its price as a float.
+        """
+        endpoint = "/api/v3/ticker/price"
+        # The batched endpoint takes the symbols as a compact JSON array
+        params = {'symbols': json.dumps(list(symbols), separators=(',', ':'))}
+        try:
+            data = self._send_request('GET', endpoint, params)
+            return {ticker['symbol']: float(ticker['price']) for ticker in data}
+        except Exception as e:
+            logging.error("Error fetching prices: %s", e)
             raise
 
 
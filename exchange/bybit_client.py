@@ -1,21 +1,44 @@
 import os
-import time
-import hashlib
+import asyncio
 import hmac
-import requests
 import logging
-import uuid
-from dotenv import load_dotenv
+import json
+import secrets
+import collections
+import functools
+from exchange import _config  # noqa: F401  (loads the .env file once)
+from exchange.utils import ExchangeClient, ttl_cache
 
-class BybitClient:
-    def __init__(self, testnet=True):
+
+def _parse_ticker_message(topic, message):
+    """
+    The ticker carried by a message of the `topic` stream, wrapped like a REST response so callers read both the
+    same way. None for any other message.
+    """
+    if message.get('topic') != topic:
+        return None
+    return {'result': {'list': [message['data']]}}
+
+
+class BybitClient(ExchangeClient):
+    NAME = 'Bybit'
+    # Bybit has no ping endpoint; the server time is the lightest request
+    PING_ENDPOINT = "/v5/market/time"
+    # orderLinkIds are generated in batches; the pool is topped up once it drops below the threshold
+    ORDER_LINK_ID_POOL_SIZE = 1024
+    ORDER_LINK_ID_REFILL_THRESHOLD = 64
+
+    def __init__(self, testnet=True, price_ttl=0.25, timeout=(1.0, 3.0), symbol_ttls=None):
         """
         Initialize the Bybit Client using API key and secret from environment variables.
         If `testnet=True`, it will use the Bybit Testnet endpoint.
+        Prices are cached in memory for `price_ttl` seconds to absorb bursts of identical lookups.
+        `symbol_ttls` optionally maps symbols to their own cache TTL in seconds, e.g. {'BTCUSDT': 0.1}.
+        `timeout` is the (connect, read) timeout in seconds applied to every request.
         """
-        load_dotenv()  # Load environment variables from the .env file
-        self.api_key = os.getenv("BYBIT_TESTNET_API_KEY")
-        self.api_secret = os.getenv("BYBIT_TESTNET_API_SECRET")
+        # Validation stays eager so a misconfigured client fails at construction rather than on its first order
+        env = os.environ
+        self.api_key, self.api_secret = env.get("BYBIT_TESTNET_API_KEY"), env.get("BYBIT_TESTNET_API_SECRET")
 
         if not self.api_key:
             raise ValueError("API key must be set in the .env file")
@@ -26,92 +49,171 @@ class BybitClient:
         # Set the appropriate base URL depending on whether it's testnet or mainnet
         if testnet:
             self.BASE_URL = "https://api-testnet.bybit.com"
+            self.STREAM_URL = "wss://stream-testnet.bybit.com/v5/public/spot"
         else:
             self.BASE_URL = "https://api.bybit.com"
+            self.STREAM_URL = "wss://stream.bybit.com/v5/public/spot"
         
         self.recv_window = str(5000)
 
-    def _generate_signature(self, params, timestamp):      
+        # Precompute the per-client parts of every signature so signing only formats the request-specific parts
+        self._secret_bytes = self.api_secret.encode('utf-8')
+        self._sig_middle = (self.api_key + self.recv_window).encode('utf-8')
+
+        # Headers shared by every request; signed requests pass the signature and timestamp per call
+        super().__init__(self.BASE_URL, "/v5/order", {
+            'X-BAPI-API-KEY': self.api_key,
+            'X-BAPI-SIGN-TYPE': '2',
+            'X-BAPI-RECV-WINDOW': self.recv_window,
+            'Content-Type': 'application/json'
+        }, price_ttl, timeout, symbol_ttls)
+
+        self._order_link_ids = collections.deque()
+        self._refill_order_link_ids()
+
+    def _refill_order_link_ids(self):
         """
-        Generate HMAC SHA256 signature for the parameters.
+        Top the pool of pre-generated orderLinkIds back up to ORDER_LINK_ID_POOL_SIZE random hex ids.
         """
-        param_str = str(timestamp) + self.api_key + self.recv_window + params
-        hash = hmac.new(bytes(self.api_secret, "utf-8"), param_str.encode("utf-8"), hashlib.sha256)
+        missing = self.ORDER_LINK_ID_POOL_SIZE - len(self._order_link_ids)
+        self._order_link_ids.extend(secrets.token_hex(16) for _ in range(missing))
 
-        return hash.hexdigest()
-    
-    # param_str = str(timestamp) + "test_key" + self.recv_window + params
-    # hash = hmac.new(bytes("test_secret", "utf-8"), param_str.encode("utf-8"), hashlib.sha256)
+    def _fetch_server_time(self):
+        """
+        Request the Bybit server time in milliseconds.
+        """
+        endpoint = "/v5/market/time"
+        try:
+            data = self._send_request('GET', endpoint)
+            return int(data['time'])
+        except Exception as e:
+            logging.error("Error syncing Bybit server time: %s", e)
+            raise
+
+    def _generate_signature(self, params, timestamp):      
+        """
+        Generate HMAC SHA256 signature for the parameters. `params` may be a query string or an already encoded body.
+        """
+        if isinstance(params, str):
+            params = params.encode("utf-8")
+        message = b''.join((str(timestamp).encode('ascii'), self._sig_middle, params))
+        # hmac.digest is the one-shot C implementation; it skips building an HMAC object per request
+        return hmac.digest(self._secret_bytes, message, 'sha256').hex()
 
     def _send_request(self, method, endpoint, params=None, signed=False):
         """
         Send HTTP request to the Bybit API.
         """
         url = f"{self.BASE_URL}{endpoint}"
-        headers = {
-            'X-BAPI-API-KEY': self.api_key,
-            'X-BAPI-SIGN-TYPE': '2',
-            'X-BAPI-RECV-WINDOW': self.recv_window,
-            'Content-Type': 'application/json'
-        }
+        headers = None
+
+        if method == 'POST' and isinstance(params, dict):
+            # Serialize the body once, as compact ASCII JSON, so the exact bytes that are signed are also sent
+            params = json.dumps(params, separators=(',', ':')).encode('ascii')
 
         if signed:
-            timestamp = str(int(time.time() * 10 ** 3))
-            signature = self._generate_signature(params, timestamp)
-            headers.update({
-                'X-BAPI-SIGN': signature,
+            timestamp = str(self._timestamp())
+            # requests merges these per-request headers over the session headers without modifying them
+            headers = {
+                'X-BAPI-SIGN': self._generate_signature(params, timestamp),
                 'X-BAPI-TIMESTAMP': timestamp
-            })
+            }
 
-        try:
-            if method == 'GET':
-                response = requests.get(url, headers=headers, params=params)
-            elif method == 'POST':
-                response = requests.post(url, headers=headers, data=params)
-
-            response.raise_for_status()  # Raise an HTTPError for bad responses
-            return response.json()
-        except requests.exceptions.Timeout as e:
-            logging.error("Request timed out for _send_request function")
-            raise
-        except requests.exceptions.ConnectionError:
-            logging.error("Network connection error for _send_request function")
-            raise
-        except requests.exceptions.HTTPError as e:
-            logging.error(f"HTTPError: {e.response.status_code} - {e.response.text}")
-            raise
-        except Exception as e:
-            print(e)
-            logging.error(f"Error in request: {e}")
-            raise
+        # GET parameters go into the query string, POST parameters are the JSON body
+        payload = {'params': params} if method == 'GET' else {'data': params}
+        return self._guarded_request(method, url, headers=headers, **payload)
 
+    def start_ticker(self, symbol, max_age=2.0):
+        """
+        Subscribe to the spot ticker stream of `symbol` so get_price can answer from memory instead of a REST request.
+        Falls back to a REST request whenever the stream has not delivered a ticker for `max_age` seconds.
+        """
+        topic = f"tickers.{symbol}"
+        # Bybit drops connections that stay silent for too long, so a ping goes out every 20 seconds
+        self._start_ticker(
+            symbol, self.STREAM_URL, functools.partial(_parse_ticker_message, topic),
+            subscribe={'op': 'subscribe', 'args': [topic]}, heartbeat={'op': 'ping'}, heartbeat_interval=20.0,
+            max_age=max_age
+        )
+
+    @ttl_cache
     def get_price(self, symbol):
         """
         Get the current market price of the specified symbol.
         """
+        data = self._streamed_price(symbol)
+        if data is not None:
+            return data
+        return self._fetch_price(symbol)
+
+    async def get_price_async(self, symbol):
+        """
+        Async variant of get_price; the lookup runs in a worker thread.
+        """
+        return await asyncio.to_thread(self.get_price, symbol)
+
+    def _fetch_price(self, symbol):
+        """
+        Request the current ticker of the specified symbol from the REST API.
+        """
         endpoint = "/v5/market/tickers"
         params = f"category=spot&symbol={symbol}"
         try:
             data = self._send_request('GET', endpoint, params=params)
             return data
         except Exception as e:
-            logging.error(f"Error fetching price: {e}")
+            logging.error("Error fetching price: %s", e)
+            raise
+
+    def get_prices(self, symbols):
+        """
+        Get the current market prices of several spot symbols with a single request.
+        Returns a dict mapping each requested symbol to its last price as a float; unknown symbols are left out.
+        """
+        prices = self._fetch_spot_prices()
+        return {symbol: prices[symbol] for symbol in symbols if symbol in prices}
+
+    @ttl_cache
+    def _fetch_spot_prices(self):
+        """
+        Request every spot ticker in one call and map each symbol to its last price.
+        """
+        endpoint = "/v5/market/tickers"
+        params = "category=spot"
+        try:
+            data = self._send_request('GET', endpoint, params=params)
+            return {ticker['symbol']: float(ticker['lastPrice']) for ticker in data['result']['list']}
+        except Exception as e:
+            logging.error("Error fetching prices: %s", e)
             raise
 
     def place_order(self, symbol, side, qty):
         """
         Place a market order (buy/sell) for the specified symbol and quantity.
         """
+        self._order_bucket.acquire()
+
         endpoint = "/v5/order/create"
-        orderLinkId = uuid.uuid4().hex
-        params = f'{{"category":"linear","symbol": "{symbol}","side": "{side}","positionIdx": 0,"orderType": "Market","qty": "{qty}","timeInForce": "GTC","orderLinkId": "{orderLinkId}"}}'
-        
+        if len(self._order_link_ids) < self.ORDER_LINK_ID_REFILL_THRESHOLD:
+            self._refill_order_link_ids()
+        orderLinkId = self._order_link_ids.popleft()
+        params = {
+            "category": "linear",
+            "symbol": symbol,
+            "side": side,
+            "positionIdx": 0,
+            "orderType": "Market",
+            "qty": str(qty),
+            "timeInForce": "GTC",
+            "orderLinkId": orderLinkId
+        }
+
         try:
             order = self._send_request('POST', endpoint, params=params, signed=True)
-            logging.info(f"Order placed successfully: {order}")
+            logging.info("Order placed successfully: %s", order)
             return order
         except Exception as e:
-            logging.error(f"Error placing order: {e}")
+            logging.error("Error placing order: %s", e)
             raise
 
 
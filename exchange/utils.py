@@ -0,0 +1,556 @@
+import abc
+import time
+import json
+import asyncio
+import logging
+import functools
+import threading
+import requests
+import websocket
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util import Retry
+
+
+def _now_ms():
+    """
+    Current wall-clock time in whole milliseconds, read as an integer without a float round trip.
+    """
+    return time.time_ns() // 1_000_000
+
+
+class _RetryingAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that reports a read timeout as ReadTimeout even after urllib3 has retried it. requests raises
+    retries that ran out on read timeouts as a ConnectionError, which would hide the timeout from callers.
+    """
+    def send(self, request, *args, **kwargs):
+        try:
+            return super().send(request, *args, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            if e.args and isinstance(getattr(e.args[0], 'reason', None), ReadTimeoutError):
+                raise requests.exceptions.ReadTimeout(e.args[0], request=request) from e
+            raise
+
+
+def build_session(base_url, order_prefix, headers):
+    """
+    Build the pooled session an exchange client sends every request through, with `headers` sent on each of them.
+    Returns (session, market_adapter, order_adapter): URLs under `base_url + order_prefix` use the order adapter,
+    every other https URL uses the market-data adapter.
+    """
+    # Keep one pooled session per client so keep-alive reuses the TLS connection between requests.
+    # Transient failures are retried with a short exponential backoff plus random jitter, so clients that failed
+    # together do not retry in lockstep. Only GETs are retried: a resent order could fill twice.
+    # Failed connection attempts never reached the server, so urllib3 retries those for every method.
+    # Retry-After is ignored: urllib3 would sleep for as long as the header says, beyond backoff_max and the timeout.
+    retry = Retry(
+        total=2,
+        backoff_factor=0.1,
+        backoff_jitter=0.1,
+        backoff_max=2.0,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=False,
+        raise_on_status=False  # Hand the last response back so raise_for_status reports it as before
+    )
+    session = requests.Session()
+    session.headers.update(headers)
+    # Bulkhead: order endpoints get their own connection pool, so a burst of market-data reads can never take
+    # the connections an order needs. requests picks the adapter with the longest matching URL prefix.
+    market_adapter = _RetryingAdapter(pool_connections=10, pool_maxsize=32, max_retries=retry)
+    order_adapter = _RetryingAdapter(pool_connections=1, pool_maxsize=8, max_retries=retry)
+    session.mount('https://', market_adapter)
+    session.mount(f"{base_url}{order_prefix}", order_adapter)
+    return session, market_adapter, order_adapter
+
+
+class RequestTiming(abc.ABC):
+    """
+    Request timing shared by the exchange clients: a moving average of round-trip times in `rtt`, and request
+    timestamps aligned with the exchange clock. Subclasses implement _fetch_server_time().
+    """
+    # Seconds between refreshes of the server clock offset, and seconds before a failed refresh is retried
+    TIME_SYNC_INTERVAL = 300
+    TIME_SYNC_RETRY_DELAY = 10
+    # Weight of the newest sample in the round-trip-time moving average
+    RTT_SMOOTHING = 0.2
+
+    def __init__(self):
+        # Request timestamps are the local wall clock plus an offset to the exchange clock. Unlike the monotonic
+        # clock, the wall clock keeps counting through suspends and follows NTP corrections. The offset is measured
+        # off the order path by start_time_sync(); until then, and whenever a sync fails, the last known offset is used.
+        self._time_offset_ms = 0
+        self._time_sync_stop = threading.Event()
+        self._time_sync_thread = None
+
+        # Exponentially weighted moving average of request round-trip times in seconds, None until measured
+        self.rtt = None
+
+    @abc.abstractmethod
+    def _fetch_server_time(self):
+        """
+        Request the exchange server time in milliseconds.
+        """
+
+    def _timestamp(self):
+        """
+        Current exchange time in milliseconds: the local wall clock plus the last measured server offset.
+        """
+        return _now_ms() + self._time_offset_ms
+
+    def sync_time(self):
+        """
+        Align request timestamps with the exchange server clock so a drifting local clock cannot push requests
+        outside the receive window.
+        """
+        sent_ms = _now_ms()
+        server_ms = self._fetch_server_time()
+        received_ms = _now_ms()
+        # Assume the server stamped its reply halfway through the round trip
+        self._time_offset_ms = server_ms - (sent_ms + received_ms) // 2
+
+    def start_time_sync(self):
+        """
+        Measure the server clock offset on a background thread right away and every TIME_SYNC_INTERVAL seconds
+        after that, so an order never waits for a server-time request.
+        """
+        if self._time_sync_thread is not None and self._time_sync_thread.is_alive():
+            return
+        self._time_sync_stop.clear()
+        self._time_sync_thread = threading.Thread(target=self._time_sync_loop, daemon=True)
+        self._time_sync_thread.start()
+
+    def stop_time_sync(self):
+        """
+        Stop the background clock sync and wait for its thread to exit.
+        """
+        self._time_sync_stop.set()
+        if self._time_sync_thread is not None:
+            self._time_sync_thread.join()
+            self._time_sync_thread = None
+
+    def _time_sync_loop(self):
+        while not self._time_sync_stop.is_set():
+            try:
+                self.sync_time()
+                delay = self.TIME_SYNC_INTERVAL
+            except Exception:
+                # _fetch_server_time has logged the error; keep the last known offset and retry after a short pause
+                delay = self.TIME_SYNC_RETRY_DELAY
+            self._time_sync_stop.wait(delay)
+
+    def _record_rtt(self, elapsed):
+        """
+        Fold one measured round trip into the moving average in `self.rtt`.
+        """
+        if self.rtt is None:
+            self.rtt = elapsed
+        else:
+            self.rtt += self.RTT_SMOOTHING * (elapsed - self.rtt)
+
+
+class TTLCache:
+    def __init__(self, ttl, maxsize=None, symbol_ttls=None):
+        """
+        Thread-safe in-memory cache whose entries expire `ttl` seconds after they are stored.
+        `symbol_ttls` maps symbols to their own TTL in seconds, for entries stored with a `ttl` from ttl_for().
+        If `maxsize` is set, storing a new key in a full cache first drops the expired entries and then,
+        if it is still full, the oldest one.
+        """
+        self.ttl = ttl
+        self.symbol_ttls = dict(symbol_ttls or {})
+        self.maxsize = maxsize
+        # Insertion ordered, so the first key is always the oldest entry
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached value for `key`, or None if it is missing or has expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def ttl_for(self, symbol):
+        """
+        TTL in seconds for prices of `symbol`: its entry in `symbol_ttls`, otherwise the default `ttl`.
+        """
+        return self.symbol_ttls.get(symbol, self.ttl)
+
+    def set(self, key, value, ttl=None):
+        """
+        Store `value` under `key` until `ttl` seconds, or the default TTL if not given, have elapsed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            # Re-insert rather than overwrite so a refreshed key moves to the end of the eviction order
+            self._data.pop(key, None)
+            if self.maxsize is not None and len(self._data) >= self.maxsize:
+                self._evict(now)
+            self._data[key] = (now + (self.ttl if ttl is None else ttl), value)
+
+    def _evict(self, now):
+        """
+        Make room for one entry: drop every expired entry, or the oldest one if none has expired.
+        Must be called with the lock held.
+        """
+        expired = [key for key, (expires, _) in self._data.items() if expires <= now]
+        for key in expired:
+            del self._data[key]
+        if len(self._data) >= self.maxsize:
+            del self._data[next(iter(self._data))]
+
+    def clear(self):
+        """
+        Drop every cached entry.
+        """
+        with self._lock:
+            self._data.clear()
+
+
+def ttl_cache(func=None, *, symbol=None):
+    """
+    Serve a client method from the client's `_price_cache` while the cached value is fresh.
+    The cache key is the method name plus the call arguments. Values are kept for the cache's TTL for `symbol`,
+    or, without it, for the symbol passed as the first argument; methods without arguments use the default TTL.
+    Use as @ttl_cache or @ttl_cache(symbol='BTCUSDT').
+    """
+    if func is None:
+        return functools.partial(ttl_cache, symbol=symbol)
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        value = self._price_cache.get(key)
+        if value is None:
+            value = func(self, *args, **kwargs)
+            cached_symbol = symbol if symbol is not None else (args[0] if args else None)
+            self._price_cache.set(key, value, ttl=self._price_cache.ttl_for(cached_symbol))
+        return value
+    return wrapper
+
+
+class PriceStream:
+    # Seconds a receive may block, so heartbeats go out on time and a stop request is noticed without a second thread
+    RECEIVE_TIMEOUT = 1.0
+
+    def __init__(self, url, parse, subscribe=None, heartbeat=None, heartbeat_interval=20.0, max_age=2.0,
+                 reconnect_delay=1.0):
+        """
+        Keep the latest value pushed by the WebSocket stream at `url` in memory, received on a background thread.
+        Every JSON message is passed to `parse`, which returns the new value, or None for messages that carry none.
+        `subscribe` is sent after connecting and `heartbeat` every `heartbeat_interval` seconds, both as JSON, if set.
+        Values older than `max_age` seconds are treated as stale so callers fall back to a direct request.
+        A dropped connection is re-opened after `reconnect_delay` seconds.
+        """
+        self.url = url
+        self._parse = parse
+        self.subscribe = subscribe
+        self.heartbeat = heartbeat
+        self.heartbeat_interval = heartbeat_interval
+        self.max_age = max_age
+        self.reconnect_delay = reconnect_delay
+        # (monotonic timestamp, value); replaced as a whole so readers never need a lock
+        self._latest = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._ws = None
+
+    def start(self):
+        """
+        Start the background receive thread if it is not already running.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Close the stream and wait for the background thread to exit.
+        """
+        self._stop_event.set()
+        ws = self._ws
+        if ws is not None:
+            # Wakes the thread up from a blocking receive right away
+            ws.abort()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def latest(self):
+        """
+        Return the latest value, or None if there is none fresher than `max_age` seconds.
+        """
+        entry = self._latest
+        if entry is None or time.monotonic() - entry[0] > self.max_age:
+            return None
+        return entry[1]
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._receive()
+            except Exception as e:
+                if not self._stop_event.is_set():
+                    logging.error("Error in price stream %s: %s", self.url, e)
+            self._stop_event.wait(self.reconnect_delay)
+
+    def _receive(self):
+        """
+        Connect, subscribe and store every parsed value until the connection drops or stop() is called.
+        """
+        ws = websocket.create_connection(self.url, timeout=self.RECEIVE_TIMEOUT)
+        self._ws = ws
+        try:
+            if self.subscribe is not None:
+                ws.send(json.dumps(self.subscribe))
+            next_heartbeat = time.monotonic() + self.heartbeat_interval
+            while not self._stop_event.is_set():
+                try:
+                    message = ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    message = None
+                if self.heartbeat is not None and time.monotonic() >= next_heartbeat:
+                    ws.send(json.dumps(self.heartbeat))
+                    next_heartbeat = time.monotonic() + self.heartbeat_interval
+                if message:
+                    value = self._parse(json.loads(message))
+                    if value is not None:
+                        self._latest = (time.monotonic(), value)
+        finally:
+            self._ws = None
+            ws.shutdown()
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        """
+        Token-bucket rate limiter allowing `rate` operations per second on average and bursts of up to `burst`.
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """
+        Take a token if one is available. Returns False instead of waiting when the bucket is empty.
+        """
+        with self._condition:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """
+        Take a token, blocking until the bucket has refilled enough to provide one.
+        """
+        with self._condition:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                self._condition.wait((1 - self._tokens) / self.rate)
+
+
+class CircuitBreakerError(Exception):
+    """
+    Raised instead of sending a request while the circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, fail_max=5, reset_timeout=30):
+        """
+        Circuit breaker that opens after `fail_max` consecutive failures and then rejects calls for `reset_timeout`
+        seconds. After that a single trial call is let through (half-open): its success closes the breaker again,
+        its failure re-opens it for another `reset_timeout` seconds.
+        """
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raise CircuitBreakerError if the call must not be made right now.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if now - self._opened_at >= self.reset_timeout:
+                # Let this call through as the trial; everyone else keeps failing fast until it reports back.
+                # Restarting the clock lets another trial through should this one never report back.
+                self.state = self.HALF_OPEN
+                self._opened_at = now
+                return
+            raise CircuitBreakerError(f"Circuit breaker is {self.state}, request not sent")
+
+    def record_success(self):
+        """
+        Report a successful call: the failure count is reset and the breaker closes.
+        """
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        """
+        Report a failed call. Opens the breaker once `fail_max` failures in a row are reached, or right away
+        when the half-open trial call fails.
+        """
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.fail_max:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ExchangeClient(RequestTiming):
+    """
+    Request path shared by the exchange clients: the pooled session, client-side rate limits, the circuit breaker,
+    the price cache and the WebSocket price streams. Subclasses set NAME and PING_ENDPOINT, build their request in
+    _send_request() and send it with _guarded_request().
+    """
+    # Exchange name used in log messages, and the lightweight GET endpoint ping() warms the connections with
+    NAME = None
+    PING_ENDPOINT = None
+    # Most price lookups (symbol and endpoint combinations) kept in the price cache at once
+    PRICE_CACHE_SIZE = 64
+    # Consecutive failed requests that open the circuit breaker, and seconds it stays open before a trial request
+    BREAKER_FAIL_MAX = 5
+    BREAKER_RESET_TIMEOUT = 30
+
+    def __init__(self, base_url, order_prefix, headers, price_ttl, timeout, symbol_ttls=None):
+        """
+        Set up the request path for the exchange at `base_url`. URLs under `base_url + order_prefix` get the order
+        connection pool, `headers` are sent with every request and `timeout` is the (connect, read) timeout.
+        Prices are cached in memory for `price_ttl` seconds, or for the seconds `symbol_ttls` maps their symbol to.
+        """
+        self.timeout = timeout
+        self.session, self._market_adapter, self._order_adapter = build_session(base_url, order_prefix, headers)
+
+        self._price_cache = TTLCache(ttl=price_ttl, maxsize=self.PRICE_CACHE_SIZE, symbol_ttls=symbol_ttls)
+        # WebSocket price streams keyed by symbol, see _start_ticker()
+        self._tickers = {}
+
+        # Pace requests on the client side instead of absorbing the exchange's 429 back-offs
+        self._order_bucket = TokenBucket(rate=10, burst=20)
+        self._market_data_bucket = TokenBucket(rate=50, burst=100)
+
+        # Fail fast while the exchange is unreachable instead of paying the full timeout on every request
+        self._breaker = CircuitBreaker(fail_max=self.BREAKER_FAIL_MAX, reset_timeout=self.BREAKER_RESET_TIMEOUT)
+
+        # Round-trip times and the offset to the server clock, see RequestTiming
+        super().__init__()
+
+    def _guarded_request(self, method, url, **kwargs):
+        """
+        Send one request through the circuit breaker and, for GETs, the market-data rate limit, and return the
+        parsed JSON response. The round trip is folded into `rtt`. Errors are logged and raised.
+        """
+        try:
+            self._breaker.before_call()
+        except CircuitBreakerError as e:
+            logging.error("%s for _send_request function: %s", e, url)
+            raise
+
+        if method == 'GET':
+            self._market_data_bucket.acquire()
+
+        try:
+            started = time.monotonic()
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            self._record_rtt(time.monotonic() - started)
+
+            response.raise_for_status()  # Raise an HTTPError for bad responses
+            self._breaker.record_success()
+            return response.json()
+        except requests.exceptions.Timeout:
+            self._breaker.record_failure()
+            logging.error("Request timed out for _send_request function")
+            raise
+        except requests.exceptions.ConnectionError:
+            self._breaker.record_failure()
+            logging.error("Network connection error for _send_request function")
+            raise
+        except requests.exceptions.HTTPError as e:
+            # Server errors and request timeouts mean the exchange is struggling; other errors mean it answered
+            if e.response.status_code >= 500 or e.response.status_code == 408:
+                self._breaker.record_failure()
+            else:
+                self._breaker.record_success()
+            logging.error("HTTPError for _send_request function: %s - %s", e.response.status_code, e.response.text)
+            raise
+        except Exception as e:
+            logging.error("Error in request for _send_request function: %s", e)
+            raise
+
+    def ping(self):
+        """
+        Call the lightweight PING_ENDPOINT so the pooled connections for market data and orders are open before
+        the first real request, and start keeping the server clock offset fresh in the background.
+        """
+        try:
+            data = self._send_request('GET', self.PING_ENDPOINT)
+            # The order endpoints use a separate connection pool; open a connection in it as well
+            request = self.session.prepare_request(requests.Request('GET', f"{self.BASE_URL}{self.PING_ENDPOINT}"))
+            self._order_adapter.send(request, timeout=self.timeout).raise_for_status()
+            # Measure the server clock offset now, and keep it fresh, instead of on the order path
+            self.start_time_sync()
+            return data
+        except Exception as e:
+            logging.error("Error pinging %s: %s", self.NAME, e)
+            raise
+
+    def _start_ticker(self, symbol, url, parse, **kwargs):
+        """
+        Start the price stream for `symbol`, creating it as PriceStream(url, parse, **kwargs) on first use.
+        """
+        if symbol not in self._tickers:
+            self._tickers[symbol] = PriceStream(url, parse, **kwargs)
+        self._tickers[symbol].start()
+
+    def _streamed_price(self, symbol):
+        """
+        The latest value of the price stream for `symbol`, or None if there is no stream or its value is stale.
+        """
+        stream = self._tickers.get(symbol)
+        return stream.latest() if stream is not None else None
+
+    def stop_tickers(self):
+        """
+        Close every price stream.
+        """
+        for ticker in self._tickers.values():
+            ticker.stop()
+        self._tickers.clear()
+
+    async def place_order_async(self, symbol, side, quantity):
+        """
+        Async variant of place_order, so several orders can be awaited together with asyncio.gather.
+        The request runs in a worker thread and still goes through the pooled session, rate limiter and signing.
+        """
+        return await asyncio.to_thread(self.place_order, symbol, side, quantity)
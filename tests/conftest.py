@@ -0,0 +1,80 @@
+import copy
+import socket
+import pytest
+from unittest.mock import MagicMock
+from exchange.binance_client import BinanceClient
+from exchange.bybit_client import BybitClient
+from client import TradingClient
+
+# Attribute names for the exchange client mocks, collected once so each MagicMock(spec=...) does not walk the class again.
+# Mocks are still built per test: copies of one template mock would share their child mocks and return values.
+_BINANCE_SPEC = dir(BinanceClient)
+_BYBIT_SPEC = dir(BybitClient)
+
+
+# Building a client reads the environment, loads the private key and opens a session, so the tests that
+# do not exercise initialization share one instance per exchange. The price cache is disabled so a price
+# cached by one test can never answer the next one.
+
+@pytest.fixture(scope="session")
+def binance_client():
+    client = BinanceClient(testnet=True, price_ttl=0)
+    yield client
+    client.session.close()
+
+
+@pytest.fixture(scope="session")
+def bybit_client():
+    client = BybitClient(testnet=True, price_ttl=0)
+    yield client
+    client.session.close()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _stub_exchange_classes():
+    # TradingClient never builds real exchange clients in the tests: the constructors are replaced by MagicMock
+    # for the whole session. The exchange client tests import the real classes from exchange.* and are unaffected.
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr('client.BinanceClient', MagicMock)
+        monkeypatch.setattr('client.BybitClient', MagicMock)
+        yield
+
+
+@pytest.fixture(scope="session")
+def trading_client_prototype():
+    # Quotes are not reused between calls either, so place_order always routes on the prices a test sets up
+    trading_client = TradingClient(testnet=True, price_ttl=0, quote_ttl=0)
+    yield trading_client
+    trading_client.close()
+
+
+@pytest.fixture
+def client(trading_client_prototype):
+    # A shallow copy per test: the exchange clients and worker threads are shared, but attributes a test assigns
+    # (quote_ttl, cached quotes) stay local to that test
+    return copy.copy(trading_client_prototype)
+
+
+@pytest.fixture
+def mocked_client(client):
+    """
+    The per-test client copy with both exchange clients replaced by mocks. Plain assignment is enough because
+    the copy is discarded after the test. Returns (client, mock_binance, mock_bybit).
+    """
+    mock_binance, mock_bybit = MagicMock(spec=_BINANCE_SPEC), MagicMock(spec=_BYBIT_SPEC)
+    client.binance_client = mock_binance
+    client.bybit_client = mock_bybit
+    return client, mock_binance, mock_bybit
+
+
+@pytest.fixture
+def hanging_server():
+    """
+    Base URL of a local server that accepts connections but never answers. Returns http://127.0.0.1:<port>.
+    """
+    # The kernel completes the TCP handshake for queued connections, so nothing ever needs to call accept()
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(16)
+    yield f"http://127.0.0.1:{server.getsockname()[1]}"
+    server.close()
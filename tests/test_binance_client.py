@@ -1,16 +1,16 @@
+import asyncio
 import os
 import pytest
 from unittest.mock import patch, MagicMock, mock_open
-from exchange.binance_client import BinanceClient
+from exchange.binance_client import BinanceClient, _parse_ticker_event
+from exchange.utils import _now_ms
 import requests
-import logging
-import time
-import builtins
-import logging
 import sys
+import base64
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 
-# Set up basic logging configuration (optional, for better log visibility)
-logging.basicConfig(level=logging.ERROR) 
+# Exchange timestamp (2024-01-01 00:00:00 UTC in milliseconds) that order tests freeze request time at
+FROZEN_TS = 1704067200000
 
 # --- Initialization Tests ---
 
@@ -26,13 +26,8 @@ def test_missing_private_key_file():
     project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     private_key_path = os.path.join(project_root, 'exchange', 'test-prv-key.pem')
 
-    # Use the original `open` function
-    original_open = builtins.open
-    
-    # Patches the built-in open function to raise FileNotFoundError only for the private key path.
-    with patch("builtins.open", side_effect=lambda filename, *args, **kwargs: (
-        original_open(filename, *args, **kwargs) if filename != private_key_path else (_ for _ in ()).throw(FileNotFoundError)
-    )):
+    # Report the private key file as missing without touching the file system.
+    with patch("exchange.binance_client.os.path.isfile", return_value=False):
         # Expects BinanceClient to raise a ValueError with a specific message due to the missing private key file.
         with pytest.raises(ValueError, match=f"Private key file not found at {private_key_path}"):
             BinanceClient(testnet=True)
@@ -63,6 +58,12 @@ def test_wrong_private_key_password():
         with pytest.raises(ValueError, match="the provided password may be incorrect"):
             BinanceClient(testnet=True)
             
+# Test 1.6: Ensure clients loading the same key file share one parsed key object.
+def test_private_key_shared_between_clients():
+    client_a = BinanceClient(testnet=True)
+    client_b = BinanceClient(testnet=False)
+    assert client_a.private_key is client_b.private_key
+
 # Test 1.7: Confirm that Testnet key password is loaded correctly from the environment variables.
 def test_missing_private_key_password():
     with patch.dict(os.environ, {"BINANCE_TESTNET_KEY_PASSWORD": ""}):
@@ -83,161 +84,138 @@ def test_unencodable_private_key_password():
 
 # Test 2.1: Mock the _sign_request method to confirm it correctly builds and returns a valid signature.
 @patch.object(BinanceClient, '_sign_request')
-def test_sign_request(mock_sign_request):
+def test_sign_request(mock_sign_request, binance_client):
     mock_sign_request.return_value = "mocked_signature"
-    client = BinanceClient(testnet=True)
-    params = {'symbol': 'BTCUSDT', 'side': 'BUY', 'quantity': 0.001, 'timestamp': int(time.time() * 1000)}
-    signature = client._sign_request(params)
+    payload = f"symbol=BTCUSDT&side=BUY&quantity=0.001&timestamp={_now_ms()}".encode('ASCII')
+    signature = binance_client._sign_request(payload)
     assert signature == "mocked_signature"
-    mock_sign_request.assert_called_once_with(params)
+    mock_sign_request.assert_called_once_with(payload)
 
 # Test 2.2: Test that _sign_request logs an error and raises an exception if an error occurs during signing.
-def test_sign_request_error_logging():
-    client = BinanceClient(testnet=True)
+def test_sign_request_error_logging(binance_client, caplog):
     
     # Mock the `self.private_key.sign` method to raise an exception
-    with patch.object(client, 'private_key', MagicMock()) as mock_private_key:
+    with patch.object(binance_client, 'private_key', MagicMock()) as mock_private_key:
         mock_private_key.sign.side_effect = Exception("Signing error")
         
-        # Patch logging.error to ensure it is called
-        with patch('logging.error') as mock_logging:
-            with pytest.raises(Exception, match="Signing error"):
-                # Parameters for _sign_request
-                params = {'symbol': 'BTCUSDT', 'side': 'BUY', 'quantity': 0.001, 'timestamp': int(time.time() * 1000)}
+        with pytest.raises(Exception, match="Signing error"):
+            # Payload for _sign_request
+            payload = f"symbol=BTCUSDT&side=BUY&quantity=0.001&timestamp={_now_ms()}".encode('ASCII')
                 
-                # Call _sign_request, which should now raise an exception within the method
-                client._sign_request(params)
-
-            # Ensure that logging.error was called due to the exception
-            mock_logging.assert_called_once()
-            # Check that the log message is as expected
-            args, _ = mock_logging.call_args
-            assert "Error signing request for _sign_request function :" in args[0]
+            # Call _sign_request, which should now raise an exception within the method
+            binance_client._sign_request(payload)
+
+        # Ensure that exactly one error was logged and that the log message is as expected
+        assert len(caplog.records) == 1
+        assert caplog.records[0].getMessage() == "Error signing request for _sign_request function : Signing error"
+
+# Test 2.3: Ensure an Ed25519 private key signs the payload without RSA padding/hash arguments.
+def test_sign_request_ed25519(binance_client):
+    ed25519_key = Ed25519PrivateKey.generate()
+    payload = b'symbol=BTCUSDT&side=BUY&quantity=0.001&timestamp=1700000000000'
+
+    with patch.object(binance_client, 'private_key', ed25519_key):
+        signature = binance_client._sign_request(payload)
+
+    # verify() raises InvalidSignature if the signature does not match the payload
+    ed25519_key.public_key().verify(base64.b64decode(signature), payload)
+
 # --- Request Sending Tests ---
 
 # Test 3.1: Mock _send_request to simulate a successful GET request and verify the response is parsed as expected.
-def test_send_get_request_success():
-    client = BinanceClient(testnet=True)
+def test_send_get_request_success(binance_client):
     mock_response_data = {'price': '62000.0'}
-    with patch.object(client, '_send_request', return_value=mock_response_data) as mock_send_request:
-        response = client._send_request('GET', '/api/v3/ticker/price', {'symbol': 'BTCUSDT'})
+    with patch.object(binance_client, '_send_request', return_value=mock_response_data) as mock_send_request:
+        response = binance_client._send_request('GET', '/api/v3/ticker/price', {'symbol': 'BTCUSDT'})
         assert response == mock_response_data
         mock_send_request.assert_called_once_with('GET', '/api/v3/ticker/price', {'symbol': 'BTCUSDT'})
 
-# Test 3.2: Simulate a Timeout exception in _send_request and confirm it logs the correct error.
-def test_send_request_timeout():
-    client = BinanceClient(testnet=True)
-    with patch('requests.get', side_effect=requests.exceptions.Timeout):
-        with patch('logging.error') as mock_logging:
-            with pytest.raises(requests.exceptions.Timeout):
-                client._send_request('GET', '/api/v3/ticker/price', {'symbol': 'BTCUSDT'})
-            mock_logging.assert_called_with("Request timed out for _send_request function")
-
-# Test 3.3: Simulate a ConnectionError exception in _send_request and confirm it logs the correct error.
-def test_send_request_connection_error():
-    client = BinanceClient(testnet=True)
-    with patch('requests.get', side_effect=requests.exceptions.ConnectionError):
-        with patch('logging.error') as mock_logging:
-            with pytest.raises(requests.exceptions.ConnectionError):
-                client._send_request('GET', '/api/v3/ticker/price', {'symbol': 'BTCUSDT'})
-            mock_logging.assert_called_with("Network connection error for _send_request function")
-
-# Test 3.4: Simulate a HTTPError exception in _send_request with a custom status code and message, and verify the logged error message.
-def test_send_request_http_error():
-    client = BinanceClient(testnet=True)
-    mock_response = MagicMock()
-    mock_response.status_code = 403
-    mock_response.text = "Forbidden"
-    with patch('requests.get', side_effect=requests.exceptions.HTTPError(response=mock_response)):
-        with patch('logging.error') as mock_logging:
-            with pytest.raises(requests.exceptions.HTTPError):
-                client._send_request('GET', '/api/v3/ticker/price', {'symbol': 'BTCUSDT'})
-            mock_logging.assert_called_with("HTTPError for _send_request function: 403 - Forbidden")
+def _http_error(status_code, text):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = text
+    return requests.exceptions.HTTPError(response=response)
+
+# Tests 3.2-3.4: Simulate a Timeout, a ConnectionError and a HTTPError with a custom status code and message in
+# _send_request, and confirm each logs the correct error.
+@pytest.mark.parametrize("error, expected_log", [
+    (requests.exceptions.Timeout, "Request timed out for _send_request function"),
+    (requests.exceptions.ConnectionError, "Network connection error for _send_request function"),
+    (_http_error(403, "Forbidden"), "HTTPError for _send_request function: 403 - Forbidden")
+], ids=["timeout", "connection_error", "http_error"])
+def test_send_request_errors(binance_client, caplog, error, expected_log):
+    with patch.object(binance_client.session, 'request', side_effect=error):
+        with pytest.raises(requests.exceptions.RequestException):
+            binance_client._send_request('GET', '/api/v3/ticker/price', {'symbol': 'BTCUSDT'})
+        assert caplog.records[-1].getMessage() == expected_log
 
 # Test 3.5: Simulate a successful POST request in _send_request and verify that the parsed JSON response is returned as expected.
-def test_send_post_request_successful():
-    client = BinanceClient(testnet=True)
-    with patch("requests.post") as mock_post:
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.json.return_value = {"success": True}
+def test_send_post_request_successful(binance_client):
+    with patch.object(binance_client.session, 'request') as mock_request:
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.json.return_value = {"success": True}
 
         # Call _send_request and capture the response
-        response = client._send_request("POST", "/test-endpoint", {"key": "value"})
+        response = binance_client._send_request("POST", "/test-endpoint", {"key": "value"})
 
         # Assert that the response is as expected
         assert response == {"success": True}
 
-        # Ensure requests.post was called once with the expected arguments
-        mock_post.assert_called_once_with(
+        # Ensure session.request was called once with the expected arguments
+        mock_request.assert_called_once_with(
+            "POST",
             "https://testnet.binance.vision/test-endpoint",  # Example full URL
-            headers={'X-MBX-APIKEY': client.api_key},  # Ensure the API key is passed in headers if required
-            data={"key": "value"}  # Change to 'data' as used by _send_request
+            data={"key": "value"},  # Change to 'data' as used by _send_request
+            timeout=(1.0, 3.0)
         )
-# Test 3.6: Test that illegal characters in 'quantity' parameter within _send_request logs a specific error.
-def test_send_request_illegal_characters_simple_error():
-    client = BinanceClient(testnet=True)
-    mock_response = MagicMock()
-    mock_response.status_code = 400
-    mock_response.text = "Illegal characters found in parameter 'quantity'"
-    
-    with patch('requests.post', side_effect=requests.exceptions.HTTPError(response=mock_response)):
-        with patch('logging.error') as mock_logging:
-            with pytest.raises(requests.exceptions.HTTPError):
-                client._send_request('POST', '/api/v3/order', {'symbol': 'BTCUSDT', 'side': 'BUY', 'quantity': 'invalid_quantity'})
-            mock_logging.assert_called_with(
-                "HTTPError for _send_request function: 400 - Illegal characters found in parameter 'quantity'"
-            )
-
-# Test 3.7: Test that illegal characters in 'quantity' parameter within _send_request logs a specific error.
-def test_send_request_illegal_characters_detailed_error():
-    client = BinanceClient(testnet=True)
-    mock_response = MagicMock()
-    mock_response.status_code = 400
-    mock_response.text = (
-        '{"code":-1100,"msg":"Illegal characters found in parameter \'quantity\'; '
-        'legal range is \'^([0-9]{1,20})(\\\\.[0-9]{1,20})?$\'."}'
-    )
-    
-    with patch('requests.post', side_effect=requests.exceptions.HTTPError(response=mock_response)):
-        with patch('logging.error') as mock_logging:
-            with pytest.raises(requests.exceptions.HTTPError):
-                client._send_request('POST', '/api/v3/order', {'symbol': 'BTCUSDT', 'side': 'BUY', 'quantity': 'invalid_quantity'})
-            mock_logging.assert_called_with(
-                "HTTPError for _send_request function: 400 - "
-                "{\"code\":-1100,\"msg\":\"Illegal characters found in parameter 'quantity'; "
-                "legal range is '^([0-9]{1,20})(\\\\.[0-9]{1,20})?$'.\"}"
-            )
+        # The API key header is sent by the session with every request
+        assert binance_client.session.headers['X-MBX-APIKEY'] == binance_client.api_key
+# Tests 3.6-3.7: Test that illegal characters in 'quantity' parameter within _send_request log a specific error,
+# both for the plain message and for the detailed JSON error body.
+@pytest.mark.parametrize("response_text", [
+    "Illegal characters found in parameter 'quantity'",
+    '{"code":-1100,"msg":"Illegal characters found in parameter \'quantity\'; '
+    'legal range is \'^([0-9]{1,20})(\\\\.[0-9]{1,20})?$\'."}'
+], ids=["simple", "detailed"])
+def test_send_request_illegal_characters_error(binance_client, caplog, response_text):
+    with patch.object(binance_client.session, 'request', side_effect=_http_error(400, response_text)):
+        with pytest.raises(requests.exceptions.HTTPError):
+            binance_client._send_request('POST', '/api/v3/order', {'symbol': 'BTCUSDT', 'side': 'BUY', 'quantity': 'invalid_quantity'})
+        assert caplog.records[-2].getMessage() == f"HTTPError for _send_request function: 400 - {response_text}"
+        # The rejected parameter is reported on its own as well
+        assert caplog.records[-1].getMessage() == "Rejected parameter for _send_request function: quantity"
+
 # --- Order Placement Tests ---
 
 # Test 4.1: Mock _sign_request and _send_request to validate that place_order constructs the correct payload for a market order.
 @patch.object(BinanceClient, '_send_request')
 @patch.object(BinanceClient, '_sign_request', return_value="mocked_signature")
-def test_place_market_order_payload(mock_sign, mock_send):
-    client = BinanceClient(testnet=True)
-    symbol = "BTCUSDT"
-    side = "BUY"
-    quantity = 0.001
-    client.place_order(symbol, side, quantity)
-
-    expected_params = {
-        'symbol': symbol,
-        'side': side,
+@patch.object(BinanceClient, '_timestamp', return_value=FROZEN_TS)
+def test_place_market_order_payload(mock_timestamp, mock_sign, mock_send, binance_client):
+    binance_client.place_order("BTCUSDT", "BUY", 0.001)
+
+    mock_send.assert_called_once_with('POST', '/api/v3/order', params={
+        'symbol': "BTCUSDT",
+        'side': "BUY",
         'type': "MARKET",
-        'quantity': quantity,
-        'timestamp': mock_send.call_args[1]['params']['timestamp'],
+        'quantity': 0.001,
+        'timestamp': FROZEN_TS,
         'signature': "mocked_signature"
-    }
-    
-    mock_send.assert_called_once_with('POST', '/api/v3/order', params=expected_params)
+    })
+
+    # The signed payload must match the query string that is sent
+    mock_sign.assert_called_once_with(
+        f"symbol=BTCUSDT&side=BUY&type=MARKET&quantity=0.001&timestamp={FROZEN_TS}".encode('ASCII')
+    )
 
 # Test 4.2: Mock _send_request to simulate a successful order response and ensure that place_order returns the expected order details.
 @patch.object(BinanceClient, '_send_request')
-def test_place_order_success(mock_send):
+def test_place_order_success(mock_send, binance_client):
     mock_order_response = {
         "symbol": "BTCUSDT",
         "orderId": 12345678,
         "clientOrderId": "test_order",
-        "transactTime": int(time.time() * 1000),
+        "transactTime": _now_ms(),
         "price": "0.0",
         "origQty": "0.001",
         "executedQty": "0.001",
@@ -247,39 +225,136 @@ def test_place_order_success(mock_send):
     }
     mock_send.return_value = mock_order_response
 
-    client = BinanceClient(testnet=True)
-    response = client.place_order("BTCUSDT", "BUY", 0.001)
+    response = binance_client.place_order("BTCUSDT", "BUY", 0.001)
 
     assert response == mock_order_response
 
 # Test 4.3: Mock _send_request to simulate an error during order placement, and verify that place_order logs the error and raises an exception.
 @patch.object(BinanceClient, '_send_request', side_effect=Exception("Order placement error"))
-def test_place_order_error(mock_send):
-    client = BinanceClient(testnet=True)
-    with patch('logging.error') as mock_logging:
-        with pytest.raises(Exception, match="Order placement error"):
-            client.place_order("BTCUSDT", "BUY", 0.001)
-        mock_logging.assert_called_with("Error placing order for place_order function: Order placement error")
+def test_place_order_error(mock_send, binance_client, caplog):
+    with pytest.raises(Exception, match="Order placement error"):
+        binance_client.place_order("BTCUSDT", "BUY", 0.001)
+    assert caplog.records[-1].getMessage() == "Error placing order for place_order function: Order placement error"
 
 # --- BTC/USDT Price Retrieval Tests ---
 
 # Test 5.1: Mock _send_request to simulate a successful price retrieval and confirm that the method returns a float.
 @patch.object(BinanceClient, '_send_request')
-def test_get_btcusdt_price_success(mock_send):
+def test_get_btcusdt_price_success(mock_send, binance_client):
     mock_price_data = {"price": "62000.0"}
     mock_send.return_value = mock_price_data
 
-    client = BinanceClient(testnet=True)
-    price = client.get_btcusdt_price()
+    price = binance_client.get_btcusdt_price()
 
     assert isinstance(price, float)
     assert price == 62000.0
 
 # Test 5.2: Simulate an error in _send_request when calling get_btcusdt_price and ensure the error is logged, and an exception is raised.
 @patch.object(BinanceClient, '_send_request', side_effect=Exception("Price retrieval error"))
-def test_get_btcusdt_price_error(mock_send):
+def test_get_btcusdt_price_error(mock_send, binance_client, caplog):
+    with pytest.raises(Exception, match="Price retrieval error"):
+        binance_client.get_btcusdt_price()
+    assert caplog.records[-1].getMessage() == "Error fetching BTC/USDT price: Price retrieval error"
+
+# Test 5.3: Ensure get_prices fetches several symbols with one batched request.
+@patch.object(BinanceClient, '_send_request')
+def test_get_prices_batched(mock_send, binance_client):
+    mock_send.return_value = [{"symbol": "BTCUSDT", "price": "62000.0"}, {"symbol": "ETHUSDT", "price": "2500.5"}]
+
+    prices = binance_client.get_prices(['BTCUSDT', 'ETHUSDT'])
+
+    assert prices == {'BTCUSDT': 62000.0, 'ETHUSDT': 2500.5}
+    mock_send.assert_called_once_with('GET', '/api/v3/ticker/price', {'symbols': '["BTCUSDT","ETHUSDT"]'})
+
+# Test 5.4: Ensure errors from the batched request are logged and raised.
+@patch.object(BinanceClient, '_send_request', side_effect=Exception("Price retrieval error"))
+def test_get_prices_error(mock_send, binance_client, caplog):
+    with pytest.raises(Exception, match="Price retrieval error"):
+        binance_client.get_prices(['BTCUSDT'])
+    assert caplog.records[-1].getMessage() == "Error fetching prices: Price retrieval error"
+
+# Test 5.5: Ensure repeated lookups within the price TTL share one request and a lookup after it expires fetches again.
+@patch.object(BinanceClient, '_send_request', return_value={"price": "62000.0"})
+def test_get_btcusdt_price_cached_within_ttl(mock_send):
+    client = BinanceClient(testnet=True, price_ttl=1.0)
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        client.get_btcusdt_price()
+        client.get_btcusdt_price()
+    assert mock_send.call_count == 1
+    with patch('exchange.utils.time.monotonic', return_value=101.5):
+        client.get_btcusdt_price()
+    assert mock_send.call_count == 2
+
+# Test 5.6: Ensure a TTL configured for BTCUSDT overrides the default price TTL.
+@patch.object(BinanceClient, '_send_request', return_value={"price": "62000.0"})
+def test_get_btcusdt_price_symbol_ttl(mock_send):
+    client = BinanceClient(testnet=True, price_ttl=1.0, symbol_ttls={'BTCUSDT': 0.1})
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        client.get_btcusdt_price()
+    with patch('exchange.utils.time.monotonic', return_value=100.5):
+        client.get_btcusdt_price()
+    assert mock_send.call_count == 2
+
+# --- Connection Warm-up Tests ---
+
+# Test 6.1: Ensure ping calls the Binance ping endpoint through both connection pools.
+@patch.object(BinanceClient, '_send_request', return_value={})
+def test_ping(mock_send, binance_client):
+    with patch.object(binance_client, '_order_adapter') as mock_order_adapter, \
+         patch.object(binance_client, 'start_time_sync') as mock_start_time_sync:
+        assert binance_client.ping() == {}
+    mock_send.assert_called_once_with('GET', '/api/v3/ping')
+    # The separate order connection pool is warmed up too
+    assert mock_order_adapter.send.call_args[0][0].url == "https://testnet.binance.vision/api/v3/ping"
+    # The server clock is synced in the background from now on, not by the first order
+    mock_start_time_sync.assert_called_once()
+
+# --- Price Ticker Tests ---
+
+# Test 7.1: Ensure get_btcusdt_price answers from a fresh ticker without a REST request.
+@patch.object(BinanceClient, '_send_request')
+def test_get_btcusdt_price_from_ticker(mock_send):
     client = BinanceClient(testnet=True)
-    with patch('logging.error') as mock_logging:
-        with pytest.raises(Exception, match="Price retrieval error"):
-            client.get_btcusdt_price()
-        mock_logging.assert_called_with("Error fetching BTC/USDT price: Price retrieval error")
\ No newline at end of file
+    client._tickers['BTCUSDT'] = MagicMock(**{'latest.return_value': 63000.0})
+
+    assert client.get_btcusdt_price() == 63000.0
+    mock_send.assert_not_called()
+
+# Test 7.2: Ensure get_btcusdt_price falls back to REST when the ticker is stale.
+@patch.object(BinanceClient, '_send_request', return_value={"price": "62000.0"})
+def test_get_btcusdt_price_stale_ticker(mock_send):
+    client = BinanceClient(testnet=True)
+    client._tickers['BTCUSDT'] = MagicMock(**{'latest.return_value': None})
+
+    assert client.get_btcusdt_price() == 62000.0
+    mock_send.assert_called_once()
+
+# Test 7.3: Ensure 24hr ticker events yield their last price and other stream messages are ignored.
+def test_parse_ticker_event():
+    assert _parse_ticker_event({"e": "24hrTicker", "s": "BTCUSDT", "c": "63000.0"}) == 63000.0
+    assert _parse_ticker_event({"result": None, "id": 1}) is None
+
+# --- Server Time Sync Tests ---
+
+# Test 8.1: Ensure sync_time anchors request timestamps on the server clock.
+@patch.object(BinanceClient, '_send_request', return_value={"serverTime": 1700000000000})
+def test_sync_time(mock_send):
+    client = BinanceClient(testnet=True)
+    with patch('exchange.utils.time.time_ns', return_value=1_600_000_000_000_000_000):
+        client.sync_time()
+        assert client._timestamp() == 1700000000000
+    mock_send.assert_called_once_with('GET', '/api/v3/time')
+
+# --- Async Tests ---
+
+# Test 9.1: Ensure the async price lookup returns the same result as the blocking one.
+def test_get_btcusdt_price_async(binance_client):
+    with patch.object(binance_client, 'get_btcusdt_price', return_value=62000.0):
+        assert asyncio.run(binance_client.get_btcusdt_price_async()) == 62000.0
+
+# --- Bulkhead Tests ---
+
+# Test 10.1: Ensure order endpoints use the order connection pool and other endpoints the market-data pool.
+def test_order_and_market_data_pools_are_separate(binance_client):
+    assert binance_client.session.get_adapter("https://testnet.binance.vision/api/v3/order") is binance_client._order_adapter
+    assert binance_client.session.get_adapter("https://testnet.binance.vision/api/v3/ping") is binance_client._market_adapter
@@ -1,16 +1,21 @@
+import asyncio
 from unittest.mock import patch, MagicMock
 import pytest
-from exchange.bybit_client import BybitClient
+from exchange.bybit_client import BybitClient, _parse_ticker_message
 import requests
-import logging
-import time
 import os
 import hmac
 import hashlib
 import json
 
-# Set up basic logging configuration (optional, for better log visibility)
-logging.basicConfig(level=logging.ERROR)
+# Expected signature of "category=spot&symbol=BTCUSDT" at timestamp 1234567890 for the "test_key"/"test_secret"
+# credentials with the default 5000 ms receive window.
+RECV_WINDOW = "5000"
+EXPECTED_SIG = hmac.digest(
+    b"test_secret",
+    f"1234567890test_key{RECV_WINDOW}category=spot&symbol=BTCUSDT".encode("utf-8"),
+    'sha256'
+).hex()
 
 # --- Initialization Tests ---
 
@@ -44,114 +49,196 @@ def test_generate_signature():
         "BYBIT_TESTNET_API_SECRET": "test_secret"
     }):
         client = BybitClient(testnet=True)
-        params = "category=spot&symbol=BTCUSDT"
-        timestamp = "1234567890"
+        assert client.recv_window == RECV_WINDOW
+        assert client._generate_signature("category=spot&symbol=BTCUSDT", "1234567890") == EXPECTED_SIG
+
+# Test 2.2: Ensure signing a request does not leak the signature headers into the session headers.
+def test_signed_request_does_not_mutate_shared_headers(bybit_client):
+    with patch.object(bybit_client.session, 'request') as mock_request:
+        bybit_client._send_request('POST', '/v5/order/create', '{}', signed=True)
+
+        sent_headers = mock_request.call_args[1]['headers']
+        assert 'X-BAPI-SIGN' in sent_headers
+        assert 'X-BAPI-SIGN' not in bybit_client.session.headers
+
+# Test 2.3: Ensure an encoded order body is signed byte for byte as it is sent.
+def test_signed_request_signs_sent_body(bybit_client):
+    body = b'{"category":"linear","symbol":"BTCUSDT"}'
+    with patch.object(bybit_client.session, 'request') as mock_request:
+        bybit_client._send_request('POST', '/v5/order/create', body, signed=True)
+
+        kwargs = mock_request.call_args[1]
+        assert kwargs['data'] is body
         expected_signature = hmac.new(
-            bytes("test_secret","utf-8"),
-            f"{timestamp}test_key{client.recv_window}{params}".encode("utf-8"),
+            bybit_client.api_secret.encode("utf-8"),
+            f"{kwargs['headers']['X-BAPI-TIMESTAMP']}{bybit_client.api_key}{bybit_client.recv_window}".encode("utf-8") + body,
             hashlib.sha256
         ).hexdigest()
-        signature = client._generate_signature(params, timestamp)
-        assert signature == expected_signature
+        assert kwargs['headers']['X-BAPI-SIGN'] == expected_signature
+
+# Test 2.4: Ensure a dict body is serialized once into compact JSON that is both signed and sent.
+def test_signed_request_serializes_dict_body(bybit_client):
+    with patch.object(bybit_client.session, 'request') as mock_request, \
+         patch.object(bybit_client, '_generate_signature', return_value="mocked_signature") as mock_sign:
+        bybit_client._send_request('POST', '/v5/order/create', {"category": "linear", "qty": "0.02"}, signed=True)
+
+    body = mock_request.call_args[1]['data']
+    assert body == b'{"category":"linear","qty":"0.02"}'
+    assert mock_sign.call_args[0][0] is body
 
 # --- Request Sending Tests ---
 
 # Test 3.1: Mock _send_request to simulate a successful GET request and verify the response is parsed as expected.
-def test_send_get_request_success():
-    client = BybitClient(testnet=True)
+def test_send_get_request_success(bybit_client):
     mock_response_data = {'result': {'price': '62000.0'}}
-    with patch.object(client, '_send_request', return_value=mock_response_data) as mock_send_request:
-        response = client._send_request('GET', '/v5/market/tickers', {'category': 'spot', 'symbol': 'BTCUSDT'})
+    with patch.object(bybit_client, '_send_request', return_value=mock_response_data) as mock_send_request:
+        response = bybit_client._send_request('GET', '/v5/market/tickers', {'category': 'spot', 'symbol': 'BTCUSDT'})
         assert response == mock_response_data
         mock_send_request.assert_called_once_with('GET', '/v5/market/tickers', {'category': 'spot', 'symbol': 'BTCUSDT'})
 
 # Test 3.2: Simulate a Timeout exception in _send_request and confirm it logs the correct error.
-def test_send_request_timeout():
-    with patch('requests.get', side_effect=requests.exceptions.Timeout):
-        with patch('logging.error') as mock_logging:
-            with pytest.raises(requests.exceptions.Timeout):
-                client = BybitClient(testnet=True)
-                answer=client._send_request('GET', '/v5/market/tickers', {'category': 'spot', 'symbol': 'BTCUSDT'})
-            mock_logging.assert_called_with("Request timed out for _send_request function")
+def test_send_request_timeout(bybit_client, caplog):
+    with patch.object(bybit_client.session, 'request', side_effect=requests.exceptions.Timeout):
+        with pytest.raises(requests.exceptions.Timeout):
+            answer=bybit_client._send_request('GET', '/v5/market/tickers', {'category': 'spot', 'symbol': 'BTCUSDT'})
+        assert caplog.records[-1].getMessage() == "Request timed out for _send_request function"
 
 # Test 3.3: Simulate a ConnectionError exception in _send_request and confirm it logs the correct error.
-def test_send_request_connection_error():
-    client = BybitClient(testnet=True)
-    with patch('requests.get', side_effect=requests.exceptions.ConnectionError):
-        with patch('logging.error') as mock_logging:
-            with pytest.raises(requests.exceptions.ConnectionError):
-                client._send_request('GET', '/v5/market/tickers', {'category': 'spot', 'symbol': 'BTCUSDT'})
-            mock_logging.assert_called_with("Network connection error for _send_request function")
+def test_send_request_connection_error(bybit_client, caplog):
+    with patch.object(bybit_client.session, 'request', side_effect=requests.exceptions.ConnectionError):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            bybit_client._send_request('GET', '/v5/market/tickers', {'category': 'spot', 'symbol': 'BTCUSDT'})
+        assert caplog.records[-1].getMessage() == "Network connection error for _send_request function"
 
 # Test 3.4: Simulate a HTTPError exception in _send_request and confirm it logs the correct error.
-def test_send_request_http_error():
+def test_send_request_http_error(bybit_client, caplog):
     # Mock the response to simulate an HTTPError with a status code and error message
     mock_response = MagicMock()    
     mock_response.status_code = 404
     mock_response.text = "Not Found"
     
-    # Patch `requests.get` to raise an HTTPError with the mocked response
-    with patch('requests.get', side_effect=requests.exceptions.HTTPError(response=mock_response)):
-        with patch('logging.error') as mock_logging:
-            with pytest.raises(requests.exceptions.HTTPError):
-                client = BybitClient(testnet=True)
-                client._send_request('GET', '/v5/market/tickers', {'category': 'spot', 'symbol': 'BTCUSDT'})
+    # Patch the session's `get` to raise an HTTPError with the mocked response
+    with patch.object(bybit_client.session, 'request', side_effect=requests.exceptions.HTTPError(response=mock_response)):
+        with pytest.raises(requests.exceptions.HTTPError):
+            bybit_client._send_request('GET', '/v5/market/tickers', {'category': 'spot', 'symbol': 'BTCUSDT'})
             
-            # Check that the log was created with the expected error message
-            mock_logging.assert_called_with("HTTPError: 404 - Not Found")
+        # Check that the log was created with the expected error message
+        assert caplog.records[-1].getMessage() == "HTTPError for _send_request function: 404 - Not Found"
 
 # --- Price Retrieval Tests ---
 
 # Test 4.1: Mock get_price to simulate a successful price retrieval.
 @patch.object(BybitClient, '_send_request')
-def test_get_price_success(mock_send):
+def test_get_price_success(mock_send, bybit_client):
     mock_price_data = {"result": {"price": "62000.0"}}
     mock_send.return_value = mock_price_data
 
-    client = BybitClient(testnet=True)
-    price = client.get_price('BTCUSDT')
+    price = bybit_client.get_price('BTCUSDT')
     
     assert isinstance(price, dict)
     assert price == mock_price_data
 
 # Test 4.2: Simulate an error in get_price and ensure the error is logged.
 @patch.object(BybitClient, '_send_request', side_effect=Exception("Price retrieval error"))
-def test_get_price_error(mock_send):
+def test_get_price_error(mock_send, bybit_client, caplog):
+    with pytest.raises(Exception, match="Price retrieval error"):
+        bybit_client.get_price('BTCUSDT')
+    assert caplog.records[-1].getMessage() == "Error fetching price: Price retrieval error"
+
+# Test 4.3: Ensure get_prices answers several symbols from one cached request for all spot tickers.
+@patch.object(BybitClient, '_send_request')
+def test_get_prices_batched(mock_send):
+    mock_send.return_value = {"result": {"list": [
+        {"symbol": "BTCUSDT", "lastPrice": "62000.0"},
+        {"symbol": "ETHUSDT", "lastPrice": "2500.5"},
+        {"symbol": "SOLUSDT", "lastPrice": "150.0"}
+    ]}}
+
     client = BybitClient(testnet=True)
-    with patch('logging.error') as mock_logging:
-        with pytest.raises(Exception, match="Price retrieval error"):
-            client.get_price('BTCUSDT')
-        mock_logging.assert_called_with("Error fetching price: Price retrieval error")
+    assert client.get_prices(['BTCUSDT', 'ETHUSDT']) == {'BTCUSDT': 62000.0, 'ETHUSDT': 2500.5}
+    assert client.get_prices(['SOLUSDT', 'XRPUSDT']) == {'SOLUSDT': 150.0}
+    mock_send.assert_called_once_with('GET', '/v5/market/tickers', params="category=spot")
+
+# Test 4.4: Ensure repeated lookups within the price TTL share one request and a lookup after it expires fetches again.
+@patch.object(BybitClient, '_send_request', return_value={"result": {"list": [{"lastPrice": "62000.0"}]}})
+def test_get_price_cached_within_ttl(mock_send):
+    client = BybitClient(testnet=True, price_ttl=1.0)
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        client.get_price('BTCUSDT')
+        client.get_price('BTCUSDT')
+    assert mock_send.call_count == 1
+    with patch('exchange.utils.time.monotonic', return_value=101.5):
+        client.get_price('BTCUSDT')
+    assert mock_send.call_count == 2
+
+# Test 4.5: Ensure each symbol is cached for its own TTL when one is configured.
+@patch.object(BybitClient, '_send_request', return_value={"result": {"list": [{"lastPrice": "62000.0"}]}})
+def test_get_price_symbol_ttl(mock_send):
+    client = BybitClient(testnet=True, price_ttl=1.0, symbol_ttls={'BTCUSDT': 0.1})
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        client.get_price('BTCUSDT')
+        client.get_price('ETHUSDT')
+    with patch('exchange.utils.time.monotonic', return_value=100.5):
+        client.get_price('BTCUSDT')
+        client.get_price('ETHUSDT')
+    # Only BTCUSDT, with its 0.1 s TTL, was requested again
+    assert mock_send.call_count == 3
 
 # --- Order Placement Tests ---
 
 # Test 5.1: Mock _sign_request and _send_request to validate that place_order constructs the correct payload for a market order.
 @patch.object(BybitClient, '_send_request')
 @patch.object(BybitClient, '_generate_signature', return_value="mocked_signature")
-def test_place_order_payload(mock_sign, mock_send):
-    client = BybitClient(testnet=True)
+def test_place_order_payload(mock_sign, mock_send, bybit_client):
     symbol = "BTCUSDT"
     side = "Buy"
     qty = 0.02
 
     # Call place_order to trigger the mocked _send_request
-    client.place_order(symbol, side, qty)
+    bybit_client.place_order(symbol, side, qty)
 
-    # Capture the actual params used in the _send_request call and parse it as JSON
-    actual_params = json.loads(mock_send.call_args[1]["params"])
-    
-    # Construct the expected params with the actual orderLinkId used
-    expected_params = (
-        f'{{"category":"linear","symbol": "{symbol}","side": "{side}","positionIdx": 0,"orderType": "Market",'
-        f'"qty": "{qty}","timeInForce": "GTC","orderLinkId": "{actual_params["orderLinkId"]}"}}'
-    )
+    # The orderLinkId is random, so take it from the actual call
+    actual_params = mock_send.call_args[1]["params"]
+    expected_params = {
+        "category": "linear",
+        "symbol": symbol,
+        "side": side,
+        "positionIdx": 0,
+        "orderType": "Market",
+        "qty": str(qty),
+        "timeInForce": "GTC",
+        "orderLinkId": actual_params["orderLinkId"]
+    }
 
     # Assert that _send_request was called with the correct arguments
     mock_send.assert_called_once_with('POST', '/v5/order/create', params=expected_params, signed=True)
 
-# Test 5.2: Mock _send_request to simulate a successful order response.
+# Test 5.2: Ensure special characters in the inputs still produce valid JSON on the wire.
+def test_place_order_payload_escapes_inputs(bybit_client):
+    with patch.object(bybit_client.session, 'request') as mock_request:
+        bybit_client.place_order('BTC"USDT', "Buy", 0.02)
+
+    sent_body = mock_request.call_args[1]["data"]
+    assert json.loads(sent_body)["symbol"] == 'BTC"USDT'
+
+# Test 5.3: Ensure every order gets a unique orderLinkId and the id pool is refilled when it runs low.
 @patch.object(BybitClient, '_send_request')
-def test_place_order_success(mock_send):
+def test_place_order_link_ids_unique_and_refilled(mock_send):
+    client = BybitClient(testnet=True)
+    # Lift the order rate limit, this test only cares about the id pool
+    client._order_bucket = MagicMock()
+    # Enough orders to drain the pool below the threshold, so the last one triggers a refill
+    orders = client.ORDER_LINK_ID_POOL_SIZE - client.ORDER_LINK_ID_REFILL_THRESHOLD + 2
+    for _ in range(orders):
+        client.place_order("BTCUSDT", "Buy", 0.02)
+
+    link_ids = {call[1]["params"]["orderLinkId"] for call in mock_send.call_args_list}
+    assert len(link_ids) == orders
+    assert len(client._order_link_ids) == client.ORDER_LINK_ID_POOL_SIZE - 1
+
+# Test 5.4: Mock _send_request to simulate a successful order response.
+@patch.object(BybitClient, '_send_request')
+def test_place_order_success(mock_send, bybit_client):
     mock_order_response = {
         "result": {
             "symbol": "BTCUSDT",
@@ -165,16 +252,72 @@ def test_place_order_success(mock_send):
     }
     mock_send.return_value = mock_order_response
 
-    client = BybitClient(testnet=True)
-    response = client.place_order("BTCUSDT", "Buy", 0.02)
+    response = bybit_client.place_order("BTCUSDT", "Buy", 0.02)
     
     assert response == mock_order_response
 
-# Test 5.3: Mock _send_request to simulate an error during order placement.
+# Test 5.5: Mock _send_request to simulate an error during order placement.
 @patch.object(BybitClient, '_send_request', side_effect=Exception("Order placement error"))
-def test_place_order_error(mock_send):
+def test_place_order_error(mock_send, bybit_client, caplog):
+    with pytest.raises(Exception, match="Order placement error"):
+        bybit_client.place_order("BTCUSDT", "Buy", 0.02)
+    assert caplog.records[-1].getMessage() == "Error placing order: Order placement error"
+
+# --- Connection Warm-up Tests ---
+
+# Test 6.1: Ensure ping calls the Bybit server-time endpoint through both connection pools.
+@patch.object(BybitClient, '_send_request', return_value={"retCode": 0})
+def test_ping(mock_send, bybit_client):
+    with patch.object(bybit_client, '_order_adapter') as mock_order_adapter, \
+         patch.object(bybit_client, 'start_time_sync') as mock_start_time_sync:
+        assert bybit_client.ping() == {"retCode": 0}
+    mock_send.assert_called_once_with('GET', '/v5/market/time')
+    # The separate order connection pool is warmed up too
+    assert mock_order_adapter.send.call_args[0][0].url == "https://api-testnet.bybit.com/v5/market/time"
+    # The server clock is synced in the background from now on, not by the first order
+    mock_start_time_sync.assert_called_once()
+
+# --- Price Ticker Tests ---
+
+# Test 7.1: Ensure get_price answers from a fresh ticker without a REST request.
+@patch.object(BybitClient, '_send_request')
+def test_get_price_from_ticker(mock_send):
+    ticker_data = {"result": {"list": [{"lastPrice": "63000.0"}]}}
     client = BybitClient(testnet=True)
-    with patch('logging.error') as mock_logging:
-        with pytest.raises(Exception, match="Order placement error"):
-            client.place_order("BTCUSDT", "Buy", 0.02)
-        mock_logging.assert_called_with("Error placing order: Order placement error")
+    client._tickers['BTCUSDT'] = MagicMock(**{'latest.return_value': ticker_data})
+
+    assert client.get_price('BTCUSDT') == ticker_data
+    mock_send.assert_not_called()
+
+# Test 7.2: Ensure ticker messages are wrapped like a REST response and other stream messages are ignored.
+def test_parse_ticker_message():
+    data = {"symbol": "BTCUSDT", "lastPrice": "63000.0"}
+    message = {"topic": "tickers.BTCUSDT", "type": "snapshot", "data": data}
+
+    assert _parse_ticker_message("tickers.BTCUSDT", message) == {"result": {"list": [data]}}
+    assert _parse_ticker_message("tickers.BTCUSDT", {"op": "pong", "success": True}) is None
+
+# --- Server Time Sync Tests ---
+
+# Test 8.1: Ensure sync_time anchors request timestamps on the server clock.
+@patch.object(BybitClient, '_send_request', return_value={"retCode": 0, "time": 1700000000000})
+def test_sync_time(mock_send):
+    client = BybitClient(testnet=True)
+    with patch('exchange.utils.time.time_ns', return_value=1_600_000_000_000_000_000):
+        client.sync_time()
+        assert client._timestamp() == 1700000000000
+    mock_send.assert_called_once_with('GET', '/v5/market/time')
+
+# --- Async Tests ---
+
+# Test 9.1: Ensure the async price lookup returns the same result as the blocking one.
+def test_get_price_async(bybit_client):
+    with patch.object(bybit_client, 'get_price', return_value=62000.0):
+        assert asyncio.run(bybit_client.get_price_async('BTCUSDT')) == 62000.0
+
+# --- Bulkhead Tests ---
+
+# Test 10.1: Ensure order endpoints use the order connection pool and other endpoints the market-data pool.
+def test_order_and_market_data_pools_are_separate(bybit_client):
+    assert bybit_client.session.get_adapter("https://api-testnet.bybit.com/v5/order/create") is bybit_client._order_adapter
+    assert bybit_client.session.get_adapter("https://api-testnet.bybit.com/v5/market/time") is bybit_client._market_adapter
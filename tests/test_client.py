@@ -1,177 +1,355 @@
+import logging
+import threading
+import time
 import pytest
 from unittest.mock import patch, MagicMock
-from client import TradingClient
+from client import TradingClient, _ensure_logging
 from exchange.binance_client import BinanceClient
 from exchange.bybit_client import BybitClient
 
+def _bybit_ticker(last_price):
+    return {'result': {'list': [{'lastPrice': last_price}]}}
+
 # --- Initialization Tests ---
 
 # Test 1.1: Ensure TradingClient initializes without errors.
-def test_initialization():
+def test_initialization(monkeypatch):
+    mock_binance_class, mock_bybit_class = MagicMock(), MagicMock()
+    monkeypatch.setattr('client.BinanceClient', mock_binance_class)
+    monkeypatch.setattr('client.BybitClient', mock_bybit_class)
+
     client = TradingClient(testnet=True)
-    assert client.binance_client is not None
-    assert client.bybit_client is not None
+
+    assert client.binance_client is mock_binance_class.return_value
+    assert client.bybit_client is mock_bybit_class.return_value
+    mock_binance_class.assert_called_once_with(testnet=True, price_ttl=0.25, symbol_ttls=None)
+    mock_bybit_class.assert_called_once_with(testnet=True, price_ttl=0.25, symbol_ttls=None)
 
 # --- get_best_price Tests ---
-# Test 2.1: Fetch the lowest price between Binance and Bybit
-def test_get_best_price_lower_price():
-    client = TradingClient(testnet=True)
-    with patch.object(client, 'binance_client', create=True) as mock_binance, \
-         patch.object(client, 'bybit_client', create=True) as mock_bybit:
-        
-        mock_binance.get_btcusdt_price.return_value = 60000.0
-        mock_bybit.get_price.return_value = {'result': {'list': [{'lastPrice': '61000.0'}]}}
-        
-        best_price, best_exchange = client.get_best_price(price_type='lowest')
-        
-        assert best_price == 60000.0
-        assert best_exchange == 'Binance'
+# Tests 2.1-2.6: Fetch the lowest and highest price between Binance and Bybit, fall back to Binance when Bybit returns
+# None for the price, re-raise an exception from either exchange API, and return the Bybit price string as a float.
+@pytest.mark.parametrize("binance_price, bybit_price, price_type, expected_price, expected_exchange, raises", [
+    (60000.0, '61000.0', 'lowest', 60000.0, 'Binance', None),
+    (62000.0, '61000.0', 'highest', 62000.0, 'Binance', None),
+    (Exception("Binance error"), '61000.0', 'lowest', None, None, "Binance error"),
+    (60000.0, Exception("Bybit error"), 'lowest', None, None, "Bybit error"),
+    (62000.0, None, 'lowest', 62000.0, 'Binance', None),
+    (63000.0, '62000.0', 'lowest', 62000.0, 'Bybit', None)
+], ids=["lower_price", "higher_price", "binance_exception", "bybit_exception", "bybit_none_price", "valid_prices"])
+def test_get_best_price(mocked_client, binance_price, bybit_price, price_type, expected_price, expected_exchange, raises):
+    client, mock_binance, mock_bybit = mocked_client
 
-# Test 2.2: Fetch the highest price between Binance and Bybit
-def test_get_best_price_higher_price():
-    client = TradingClient(testnet=True)
-    with patch.object(client, 'binance_client', create=True) as mock_binance, \
-         patch.object(client, 'bybit_client', create=True) as mock_bybit:
-        
-        mock_binance.get_btcusdt_price.return_value = 62000.0
-        mock_bybit.get_price.return_value = {'result': {'list': [{'lastPrice': '61000.0'}]}}
-        
-        best_price, best_exchange = client.get_best_price(price_type='highest')
-        
-        assert best_price == 62000.0
-        assert best_exchange == 'Binance'
+    if isinstance(binance_price, Exception):
+        mock_binance.get_btcusdt_price.side_effect = binance_price
+    else:
+        mock_binance.get_btcusdt_price.return_value = binance_price
+    if isinstance(bybit_price, Exception):
+        mock_bybit.get_price.side_effect = bybit_price
+    else:
+        mock_bybit.get_price.return_value = _bybit_ticker(bybit_price)
 
-# Test 2.3: Handle a case where Binance API returns an exception
-def test_get_best_price_binance_exception():
-    client = TradingClient(testnet=True)
-    with patch.object(client, 'binance_client', create=True) as mock_binance, \
-         patch.object(client, 'bybit_client', create=True) as mock_bybit:
-        
-        mock_binance.get_btcusdt_price.side_effect = Exception("Binance error")
-        mock_bybit.get_price.return_value = {'result': {'list': [{'lastPrice': '61000.0'}]}}
-        
-        with pytest.raises(Exception, match="Binance error"):
-            client.get_best_price(price_type='lowest')
+    if raises:
+        with pytest.raises(Exception, match=raises):
+            client.get_best_price(price_type=price_type)
+    else:
+        best_price, best_exchange = client.get_best_price(price_type=price_type)
+        assert (best_price, best_exchange) == (expected_price, expected_exchange)
+        assert isinstance(best_price, float), "Best price should be a float"
 
-# Test 2.4: Handle a case where Bybit API returns an exception
-def test_get_best_price_bybit_exception():
-    client = TradingClient(testnet=True)
-    with patch.object(client, 'binance_client', create=True) as mock_binance, \
-         patch.object(client, 'bybit_client', create=True) as mock_bybit:
-        
-        mock_binance.get_btcusdt_price.return_value = 60000.0
-        mock_bybit.get_price.side_effect = Exception("Bybit error")
-        
-        with pytest.raises(Exception, match="Bybit error"):
-            client.get_best_price(price_type='lowest')
+# Test 2.7: Ensure an invalid `price_type` raises a ValueError before any exchange is queried
+def test_get_best_price_invalid_price_type(mocked_client):
+    client, mock_binance, mock_bybit = mocked_client
+    
+    with pytest.raises(ValueError, match="Invalid price_type. Use 'lowest' or 'highest'."):
+        client.get_best_price(price_type='average')
+    
+    mock_binance.get_btcusdt_price.assert_not_called()
+    mock_bybit.get_price.assert_not_called()
 
-# Test 2.5: Handle a case where Bybit API returns None for the price
-def test_get_best_price_bybit_none_price():
-    client = TradingClient(testnet=True)
-    with patch.object(client, 'binance_client', create=True) as mock_binance, \
-         patch.object(client, 'bybit_client', create=True) as mock_bybit:
-        
-        mock_binance.get_btcusdt_price.return_value = 62000.0
-        mock_bybit.get_price.return_value = {'result': {'list': [{'lastPrice': None}]}}
-        
-        best_price, best_exchange = client.get_best_price(price_type='lowest')
-        
-        assert best_price == 62000.0
-        assert best_exchange == 'Binance'
+# Test 2.8: Ensure the tie-breaking of equal prices is stable
+def test_get_best_price_equal_prices(mocked_client):
+    client, mock_binance, mock_bybit = mocked_client
+    
+    mock_binance.get_btcusdt_price.return_value = 61000.0
+    mock_bybit.get_price.return_value = _bybit_ticker('61000.0')
+    
+    assert client.get_best_price(price_type='lowest') == (61000.0, 'Binance')
+    assert client.get_best_price(price_type='highest') == (61000.0, 'Bybit')
 
-# Test 2.6: Handle a case where both Binance and Bybit APIs return valid prices as floats
-def test_get_best_price_valid_prices():
-    client = TradingClient(testnet=True)
-    with patch.object(client, 'binance_client', create=True) as mock_binance, \
-         patch.object(client, 'bybit_client', create=True) as mock_bybit:
-        
-        mock_binance.get_btcusdt_price.return_value = 63000.0
-        mock_bybit.get_price.return_value = {'result': {'list': [{'lastPrice': '62000.0'}]}}
-        
-        # Get prices for lowest and highest separately to confirm they are floats
-        binance_price = client.binance_client.get_btcusdt_price()
-        bybit_price_data = client.bybit_client.get_price()
-        bybit_price = float(bybit_price_data['result']['list'][0]['lastPrice']) if 'result' in bybit_price_data else None
+# Test 2.9: Ensure both exchanges are queried concurrently rather than one after the other
+def test_get_best_price_fetches_concurrently(mocked_client):
+    client, mock_binance, mock_bybit = mocked_client
+    # Each mock waits for the other one; a sequential implementation would break the barrier
+    barrier = threading.Barrier(2, timeout=1)
 
-        # Confirm that both are floats
-        assert isinstance(binance_price, float), "Binance price should be a float"
-        assert isinstance(bybit_price, float), "Bybit price should be a float"
+    def binance_price():
+        barrier.wait()
+        return 60000.0
 
-# Test 2.7: Handle an invalid `price_type` argument
-def test_get_best_price_invalid_price_type():
-    client = TradingClient(testnet=True)
+    def bybit_price(symbol):
+        barrier.wait()
+        return _bybit_ticker('61000.0')
+
+    
+    mock_binance.get_btcusdt_price.side_effect = binance_price
+    mock_bybit.get_price.side_effect = bybit_price
     
-    with patch.object(client, 'get_best_price', side_effect=ValueError("Invalid price_type. Use 'lowest' or 'highest'.")) as mock_method:
-        with pytest.raises(ValueError, match="Invalid price_type. Use 'lowest' or 'highest'."):
-            client.get_best_price(price_type='average')
+    best_price, best_exchange = client.get_best_price(price_type='lowest')
     
-    mock_method.assert_called_once_with(price_type='average')
+    assert best_price == 60000.0
+    assert best_exchange == 'Binance'
 
 # --- place_order Tests ---
-# Test 3.1: Simulate a successful "Buy" order placement on Binance
-def test_place_order_binance():
-    client = TradingClient(testnet=True)
-    with patch.object(client, 'binance_client', create=True) as mock_binance, \
-         patch.object(client, 'bybit_client', create=True) as mock_bybit:
-        
-        mock_binance.place_order.return_value = {"order_id": "12345"}
-        
-        result = client.place_order(side='Buy', quantity=0.001, exchange='Binance')
-        
-        assert result == {"order_id": "12345"}
-        mock_binance.place_order.assert_called_once_with('BTCUSDT', 'Buy', 0.001)
+# Tests 3.1, 3.2, 3.5 and 3.6: Simulate a successful "Buy" order placement on Binance and "Sell" order placement on Bybit,
+# then the same with the client selecting the exchange with the lowest price for a "Buy" and the highest price for a "Sell"
+@pytest.mark.parametrize("side, quantity, exchange, best_price", [
+    ('Buy', 0.001, 'Binance', None),
+    ('Sell', 0.002, 'Bybit', None),
+    ('Buy', 0.001, None, (60000.0, 'Binance')),
+    ('Sell', 0.002, None, (61000.0, 'Bybit'))
+], ids=["binance", "bybit", "best_exchange_buy", "best_exchange_sell"])
+def test_place_order(mocked_client, monkeypatch, side, quantity, exchange, best_price):
+    client, mock_binance, mock_bybit = mocked_client
+    expected_exchange = exchange or best_price[1]
+    mock_exchange = mock_binance if expected_exchange == 'Binance' else mock_bybit
+    mock_exchange.place_order.return_value = {"order_id": "12345"}
+    mock_best_price = MagicMock(return_value=best_price)
+    monkeypatch.setattr(client, 'get_best_price', mock_best_price)
 
-# Test 3.2: Simulate a successful "Sell" order placement on Bybit
-def test_place_order_bybit():
-    client = TradingClient(testnet=True)
-    with patch.object(client, 'binance_client', create=True) as mock_binance, \
-         patch.object(client, 'bybit_client', create=True) as mock_bybit:
-        
-        mock_bybit.place_order.return_value = {"order_id": "54321"}
-        
-        result = client.place_order(side='Sell', quantity=0.002, exchange='Bybit')
-        
-        assert result == {"order_id": "54321"}
-        mock_bybit.place_order.assert_called_once_with('BTCUSDT', 'Sell', 0.002)
+    result = client.place_order(side=side, quantity=quantity, exchange=exchange)
+
+    assert result == {"order_id": "12345"}
+    mock_exchange.place_order.assert_called_once_with('BTCUSDT', side, quantity)
+    if exchange is None:
+        mock_best_price.assert_called_once_with('BTCUSDT', price_type='lowest' if side == 'Buy' else 'highest')
+    else:
+        mock_best_price.assert_not_called()
 
 # Test 3.3: Test that an invalid exchange name raises a ValueError
-def test_place_order_invalid_exchange():
-    client = TradingClient(testnet=True)
+def test_place_order_invalid_exchange(client):
     with pytest.raises(ValueError, match="Invalid exchange name. Use 'Binance' or 'Bybit'."):
         client.place_order(side='Buy', quantity=0.001, exchange='Unknown')
 
 # Test 3.4: Test that an invalid order side raises a ValueError
-def test_place_order_invalid_side():
-    client = TradingClient(testnet=True)
+def test_place_order_invalid_side(client):
     with pytest.raises(ValueError, match="Invalid side. Side must be either 'Buy' or 'Sell'."):
         client.place_order(side='Hold', quantity=0.001, exchange='Binance')
 
-# Test 3.5: Simulate placing a "Buy" order on the best exchange by allowing the client to select based on the lowest price
-def test_place_order_best_exchange_buy():
-    client = TradingClient(testnet=True)
-    with patch.object(client, 'binance_client', create=True) as mock_binance, \
-         patch.object(client, 'bybit_client', create=True) as mock_bybit:
+# Test 3.7: Ensure an order right after get_best_price routes on the cached quotes without fetching prices again
+def test_place_order_reuses_fresh_quotes(mocked_client):
+    client, mock_binance, mock_bybit = mocked_client
+    client.quote_ttl = 0.25
+    
+    mock_binance.get_btcusdt_price.return_value = 60000.0
+    mock_bybit.get_price.return_value = _bybit_ticker('61000.0')
+    mock_bybit.place_order.return_value = {"order_id": "54321"}
+    
+    client.get_best_price(price_type='lowest')
+    result = client.place_order(side='Sell', quantity=0.002)
+    
+    assert result == {"order_id": "54321"}
+    mock_bybit.place_order.assert_called_once_with('BTCUSDT', 'Sell', 0.002)
+    mock_binance.get_btcusdt_price.assert_called_once()
+    mock_bybit.get_price.assert_called_once()
+
+# Test 3.8: Ensure cached quotes older than quote_ttl are refreshed before routing
+def test_place_order_refreshes_stale_quotes(mocked_client, monkeypatch):
+    client, mock_binance, mock_bybit = mocked_client
+    client.quote_ttl = 0.25
+    client._last_quotes = ('BTCUSDT', 60000.0, 61000.0, 100.0)
+    mock_best_price = MagicMock(return_value=(60000.0, 'Binance'))
+    monkeypatch.setattr(client, 'get_best_price', mock_best_price)
+    monkeypatch.setattr('client.time.monotonic', lambda: 101.0)
+    
+    client.place_order(side='Buy', quantity=0.001)
+    
+    mock_best_price.assert_called_once_with('BTCUSDT', price_type='lowest')
+    mock_binance.place_order.assert_called_once_with('BTCUSDT', 'Buy', 0.001)
+
+# Test 3.9: Ensure caller-supplied prices pick the exchange without any price request
+def test_place_order_hint_prices(mocked_client, monkeypatch):
+    client, mock_binance, mock_bybit = mocked_client
+    mock_best_price = MagicMock()
+    monkeypatch.setattr(client, 'get_best_price', mock_best_price)
+    
+    client.place_order(side='Buy', quantity=0.001, hint_prices=(62000.0, 61000.0))
+    
+    mock_best_price.assert_not_called()
+    mock_bybit.place_order.assert_called_once_with('BTCUSDT', 'Buy', 0.001)
+    mock_binance.place_order.assert_not_called()
+
+# Test 3.10: Ensure a caller-supplied price missing on one exchange routes the order to the other exchange
+@pytest.mark.parametrize("hint_prices, expected_exchange", [
+    ((None, 61000.0), 'Bybit'),
+    ((62000.0, None), 'Binance')
+], ids=["binance_missing", "bybit_missing"])
+def test_place_order_hint_prices_one_missing(mocked_client, hint_prices, expected_exchange):
+    client, mock_binance, mock_bybit = mocked_client
+    
+    client.place_order(side='Buy', quantity=0.001, hint_prices=hint_prices)
+    
+    mock_exchange, other_exchange = (mock_binance, mock_bybit) if expected_exchange == 'Binance' else (mock_bybit, mock_binance)
+    mock_exchange.place_order.assert_called_once_with('BTCUSDT', 'Buy', 0.001)
+    other_exchange.place_order.assert_not_called()
+
+# Test 3.11: Ensure an order is refused when neither caller-supplied price is known
+def test_place_order_hint_prices_all_missing(mocked_client):
+    client, mock_binance, mock_bybit = mocked_client
+    
+    with pytest.raises(ValueError, match="No price available from Binance or Bybit."):
+        client.place_order(side='Sell', quantity=0.001, hint_prices=(None, None))
+    
+    mock_binance.place_order.assert_not_called()
+    mock_bybit.place_order.assert_not_called()
+
+# --- place_synchronized Tests ---
+# Test 4.1: Ensure each order is sent half of its exchange's round-trip time before the target time
+def test_place_synchronized_compensates_rtt(mocked_client, monkeypatch):
+    client, mock_binance, mock_bybit = mocked_client
+    mock_sleep = MagicMock()
+    monkeypatch.setattr('client.time.time', lambda: 1000.0)
+    monkeypatch.setattr('client.time.sleep', mock_sleep)
+    
+    mock_binance.rtt = 0.2
+    mock_bybit.rtt = 0.04
+    mock_binance.place_order.return_value = {"order_id": "12345"}
+    mock_bybit.place_order.return_value = {"order_id": "54321"}
+    
+    result = client.place_synchronized('Buy', 0.001, execute_at=1001.0)
+    
+    assert result == {'Binance': {"order_id": "12345"}, 'Bybit': {"order_id": "54321"}}
+    mock_binance.place_order.assert_called_once_with('BTCUSDT', 'Buy', 0.001)
+    mock_bybit.place_order.assert_called_once_with('BTCUSDT', 'Buy', 0.001)
+    delays = sorted(call.args[0] for call in mock_sleep.call_args_list)
+    assert delays == pytest.approx([0.9, 0.98])
+
+# Test 4.2: Ensure a failure on one exchange is raised only after the other leg has been placed
+def test_place_synchronized_one_leg_fails(mocked_client):
+    client, mock_binance, mock_bybit = mocked_client
+    
+    mock_binance.rtt = None
+    mock_bybit.rtt = None
+    mock_binance.place_order.side_effect = Exception("Binance error")
+    mock_bybit.place_order.return_value = {"order_id": "54321"}
+    
+    with pytest.raises(Exception, match="Binance error"):
+        client.place_synchronized('Sell', 0.001, execute_at=0)
+    
+    mock_bybit.place_order.assert_called_once_with('BTCUSDT', 'Sell', 0.001)
+
+# Test 4.3: Ensure an invalid side is rejected before any order is sent
+def test_place_synchronized_invalid_side(client):
+    with pytest.raises(ValueError, match="Invalid side. Side must be either 'Buy' or 'Sell'."):
+        client.place_synchronized('Hold', 0.001, execute_at=0)
+
+# Test 4.4: Ensure a synchronized order does not wait for the legs of an earlier one that target a later time
+def test_place_synchronized_overlapping_calls(mocked_client):
+    client, mock_binance, mock_bybit = mocked_client
+    mock_binance.rtt = None
+    mock_bybit.rtt = None
+    placed = []
+
+    def place_order(symbol, side, quantity):
+        placed.append((quantity, time.time()))
+        return {"order_id": "12345"}
+
+    mock_binance.place_order.side_effect = place_order
+    mock_bybit.place_order.side_effect = place_order
+    
+    now = time.time()
+    later = threading.Thread(target=client.place_synchronized, args=('Buy', 0.002), kwargs={'execute_at': now + 0.5})
+    later.start()
+    try:
+        # Give the later call time to start waiting for its send time
+        time.sleep(0.05)
+        client.place_synchronized('Buy', 0.001, execute_at=now + 0.2)
         
-        # Setup mock for get_best_price to return Binance as the best exchange for buying
-        with patch.object(client, 'get_best_price', return_value=(60000.0, 'Binance')):
-            mock_binance.place_order.return_value = {"order_id": "12345"}
-            
-            result = client.place_order(side='Buy', quantity=0.001)
-            
-            assert result == {"order_id": "12345"}
-            mock_binance.place_order.assert_called_once_with('BTCUSDT', 'Buy', 0.001)
-
-# Test 3.6: Simulate placing a "Sell" order on the best exchange by allowing the client to select based on the highest price
-def test_place_order_best_exchange_sell():
+        sent = [sent_at for quantity, sent_at in placed if quantity == 0.001]
+        assert len(sent) == 2
+        assert max(sent) < now + 0.4
+    finally:
+        later.join()
+    assert len(placed) == 4
+
+# Test 4.5: Ensure get_best_price answers while a synchronized order is waiting for its send time
+def test_place_synchronized_does_not_block_get_best_price(mocked_client):
+    client, mock_binance, mock_bybit = mocked_client
+    mock_binance.rtt = None
+    mock_bybit.rtt = None
+    mock_binance.get_btcusdt_price.return_value = 60000.0
+    mock_bybit.get_price.return_value = _bybit_ticker('61000.0')
+    
+    pending = threading.Thread(target=client.place_synchronized, args=('Buy', 0.001), kwargs={'execute_at': time.time() + 0.5})
+    pending.start()
+    try:
+        time.sleep(0.05)
+        started = time.monotonic()
+        assert client.get_best_price(price_type='lowest') == (60000.0, 'Binance')
+        assert time.monotonic() - started < 0.25
+    finally:
+        pending.join()
+    mock_binance.place_order.assert_called_once_with('BTCUSDT', 'Buy', 0.001)
+
+# --- start_tickers Tests ---
+# Test 5.1: Ensure start_tickers subscribes to the ticker stream on both exchanges
+def test_start_tickers(mocked_client):
+    client, mock_binance, mock_bybit = mocked_client
+    
+    client.start_tickers(max_age=3.0)
+    
+    mock_binance.start_ticker.assert_called_once_with(max_age=3.0)
+    mock_bybit.start_ticker.assert_called_once_with('BTCUSDT', max_age=3.0)
+
+# --- warm_up Tests ---
+# Test 6.1: Ensure warm_up pings both exchanges
+def test_warm_up(mocked_client):
+    client, mock_binance, mock_bybit = mocked_client
+    
+    client.warm_up()
+    
+    mock_binance.ping.assert_called_once_with()
+    mock_bybit.ping.assert_called_once_with()
+
+# --- close Tests ---
+# Test 7.1: Ensure close() stops the price streams, the clock sync and the worker threads, then closes both sessions
+def test_close(monkeypatch):
+    # A client of its own, so shutting down its executor cannot affect the shared prototype. The exchange client
+    # constructors are stubbed for the session, so real clients are built from exchange.* and swapped in.
     client = TradingClient(testnet=True)
-    with patch.object(client, 'binance_client', create=True) as mock_binance, \
-         patch.object(client, 'bybit_client', create=True) as mock_bybit:
-        
-        # Setup mock for get_best_price to return Bybit as the best exchange for selling
-        with patch.object(client, 'get_best_price', return_value=(61000.0, 'Bybit')):
-            mock_bybit.place_order.return_value = {"order_id": "54321"}
-            
-            result = client.place_order(side='Sell', quantity=0.002)
-            
-            assert result == {"order_id": "54321"}
-            mock_bybit.place_order.assert_called_once_with('BTCUSDT', 'Sell', 0.002)
\ No newline at end of file
+    client.binance_client, client.bybit_client = BinanceClient(testnet=True), BybitClient(testnet=True)
+    tickers, session_closes = [], []
+    for exchange_client in (client.binance_client, client.bybit_client):
+        ticker = MagicMock()
+        exchange_client._tickers['BTCUSDT'] = ticker
+        tickers.append(ticker)
+        monkeypatch.setattr(exchange_client, '_fetch_server_time', MagicMock(return_value=1700000000000))
+        exchange_client.start_time_sync()
+        session_close = MagicMock()
+        monkeypatch.setattr(exchange_client.session, 'close', session_close)
+        session_closes.append(session_close)
+
+    client.close()
+
+    for exchange_client, ticker, session_close in zip(
+            (client.binance_client, client.bybit_client), tickers, session_closes):
+        ticker.stop.assert_called_once()
+        assert exchange_client._tickers == {}
+        assert exchange_client._time_sync_thread is None
+        session_close.assert_called_once()
+    with pytest.raises(RuntimeError):
+        client._executor.submit(time.monotonic)
+
+# --- Logging Setup Tests ---
+# Test 8.1: Ensure logging is not reconfigured when the application already installed handlers
+def test_ensure_logging_keeps_existing_handlers():
+    with patch('logging.getLogger') as mock_get_logger, patch('logging.basicConfig') as mock_basic_config:
+        mock_get_logger.return_value.handlers = [MagicMock()]
+        _ensure_logging()
+        mock_basic_config.assert_not_called()
+
+# Test 8.2: Ensure INFO-level logging is configured when no handlers are installed yet
+def test_ensure_logging_configures_root_logger():
+    with patch('logging.getLogger') as mock_get_logger, patch('logging.basicConfig') as mock_basic_config:
+        mock_get_logger.return_value.handlers = []
+        _ensure_logging()
+        mock_basic_config.assert_called_once_with(level=logging.INFO)
@@ -0,0 +1,505 @@
+from unittest.mock import patch, MagicMock
+import asyncio
+import json
+import queue
+import threading
+import time
+import pytest
+import requests
+import websocket
+from exchange.utils import (
+    TTLCache, ttl_cache, PriceStream, TokenBucket, CircuitBreaker, CircuitBreakerError, RequestTiming, ExchangeClient,
+    build_session
+)
+
+# --- TTLCache Tests ---
+
+# Test 1.1: Ensure a stored value is returned while it is fresh.
+def test_ttl_cache_hit():
+    cache = TTLCache(ttl=1.0)
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        cache.set('BTCUSDT', 62000.0)
+        assert cache.get('BTCUSDT') == 62000.0
+
+# Test 1.2: Ensure a value is no longer returned once its TTL has elapsed.
+def test_ttl_cache_expiry():
+    cache = TTLCache(ttl=1.0)
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        cache.set('BTCUSDT', 62000.0)
+    with patch('exchange.utils.time.monotonic', return_value=101.0):
+        assert cache.get('BTCUSDT') is None
+
+# Test 1.3: Ensure a zero TTL disables caching.
+def test_ttl_cache_zero_ttl():
+    cache = TTLCache(ttl=0)
+    cache.set('BTCUSDT', 62000.0)
+    assert cache.get('BTCUSDT') is None
+
+# Test 1.4: Ensure clear() drops every entry.
+def test_ttl_cache_clear():
+    cache = TTLCache(ttl=1.0)
+    cache.set('BTCUSDT', 62000.0)
+    cache.clear()
+    assert cache.get('BTCUSDT') is None
+
+# Test 1.5: Ensure a full cache drops expired entries first and otherwise the oldest entry.
+def test_ttl_cache_maxsize():
+    cache = TTLCache(ttl=1.0, maxsize=2)
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        cache.set('BTCUSDT', 62000.0)
+    with patch('exchange.utils.time.monotonic', return_value=100.5):
+        cache.set('ETHUSDT', 2500.0)
+    with patch('exchange.utils.time.monotonic', return_value=101.2):
+        # BTCUSDT has expired, so it is dropped and ETHUSDT is kept
+        cache.set('SOLUSDT', 150.0)
+        assert cache.get('ETHUSDT') == 2500.0
+        # Nothing has expired now, so the oldest entry (ETHUSDT) makes room
+        cache.set('XRPUSDT', 0.5)
+        assert cache.get('ETHUSDT') is None
+        assert cache.get('SOLUSDT') == 150.0
+        assert cache.get('XRPUSDT') == 0.5
+
+# Test 1.6: Ensure symbols with their own TTL use it and every other symbol falls back to the default TTL.
+def test_ttl_cache_symbol_ttls():
+    cache = TTLCache(ttl=1.0, symbol_ttls={'BTCUSDT': 0.1})
+    assert cache.ttl_for('BTCUSDT') == 0.1
+    assert cache.ttl_for('ETHUSDT') == 1.0
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        cache.set('BTCUSDT', 62000.0, ttl=cache.ttl_for('BTCUSDT'))
+        cache.set('ETHUSDT', 2500.0, ttl=cache.ttl_for('ETHUSDT'))
+    with patch('exchange.utils.time.monotonic', return_value=100.5):
+        assert cache.get('BTCUSDT') is None
+        assert cache.get('ETHUSDT') == 2500.0
+
+# --- ttl_cache Decorator Tests ---
+
+class _PriceSource:
+    def __init__(self, ttl, symbol_ttls=None):
+        self._price_cache = TTLCache(ttl=ttl, symbol_ttls=symbol_ttls)
+        self.fetch = MagicMock(return_value=62000.0)
+
+    @ttl_cache
+    def get_price(self, symbol):
+        return self.fetch(symbol)
+
+    @ttl_cache(symbol='BTCUSDT')
+    def get_btcusdt_price(self):
+        return self.fetch('BTCUSDT')
+
+# Test 2.1: Ensure repeated calls with the same arguments within the TTL only fetch once.
+def test_ttl_cache_decorator_reuses_value():
+    source = _PriceSource(ttl=1.0)
+    assert source.get_price('BTCUSDT') == 62000.0
+    assert source.get_price('BTCUSDT') == 62000.0
+    source.fetch.assert_called_once_with('BTCUSDT')
+
+# Test 2.2: Ensure different arguments are cached under different keys.
+def test_ttl_cache_decorator_keys_by_arguments():
+    source = _PriceSource(ttl=1.0)
+    source.get_price('BTCUSDT')
+    source.get_price('ETHUSDT')
+    assert source.fetch.call_count == 2
+
+# Test 2.3: Ensure errors are not cached and propagate to the caller.
+def test_ttl_cache_decorator_does_not_cache_errors():
+    source = _PriceSource(ttl=1.0)
+    source.fetch.side_effect = [Exception("Price retrieval error"), 62000.0]
+    with pytest.raises(Exception, match="Price retrieval error"):
+        source.get_price('BTCUSDT')
+    assert source.get_price('BTCUSDT') == 62000.0
+
+# Test 2.4: Ensure a cached value lives for the TTL of the symbol passed as the first argument.
+def test_ttl_cache_decorator_symbol_ttl_from_argument():
+    source = _PriceSource(ttl=1.0, symbol_ttls={'BTCUSDT': 0.1})
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        source.get_price('BTCUSDT')
+        source.get_price('ETHUSDT')
+    with patch('exchange.utils.time.monotonic', return_value=100.5):
+        source.get_price('BTCUSDT')
+        source.get_price('ETHUSDT')
+    assert [call.args[0] for call in source.fetch.call_args_list] == ['BTCUSDT', 'ETHUSDT', 'BTCUSDT']
+
+# Test 2.5: Ensure a method bound to one symbol uses that symbol's TTL.
+def test_ttl_cache_decorator_fixed_symbol_ttl():
+    source = _PriceSource(ttl=1.0, symbol_ttls={'BTCUSDT': 0.1})
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        source.get_btcusdt_price()
+    with patch('exchange.utils.time.monotonic', return_value=100.5):
+        source.get_btcusdt_price()
+    assert source.fetch.call_count == 2
+
+# --- PriceStream Tests ---
+
+class _FakeWebSocket:
+    """
+    Stands in for a websocket-client connection: recv() hands out queued messages and sent messages are recorded.
+    """
+    def __init__(self, messages=()):
+        self.inbox = queue.Queue()
+        for message in messages:
+            self.inbox.put(message)
+        self.sent = []
+        self.closed = threading.Event()
+
+    def send(self, payload):
+        self.sent.append(json.loads(payload))
+
+    def recv(self):
+        try:
+            return self.inbox.get(timeout=0.01)
+        except queue.Empty:
+            raise websocket.WebSocketTimeoutException("timed out")
+
+    def abort(self):
+        self.closed.set()
+
+    def shutdown(self):
+        self.closed.set()
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 1
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+# Test 3.1: Ensure the stream subscribes after connecting and keeps the latest parsed value until stopped.
+def test_price_stream_subscribes_and_keeps_latest():
+    ws = _FakeWebSocket(['{"p": "62000.0"}', '{"p": "62100.0"}'])
+    stream = PriceStream("wss://example.com/ws", lambda message: float(message['p']),
+                         subscribe={'op': 'subscribe', 'args': ['tickers.BTCUSDT']})
+    with patch('exchange.utils.websocket.create_connection', return_value=ws) as mock_connect:
+        stream.start()
+        try:
+            assert _wait_for(lambda: stream.latest() == 62100.0)
+        finally:
+            stream.stop()
+    mock_connect.assert_called_once_with("wss://example.com/ws", timeout=PriceStream.RECEIVE_TIMEOUT)
+    assert ws.sent == [{'op': 'subscribe', 'args': ['tickers.BTCUSDT']}]
+    assert ws.closed.is_set()
+
+# Test 3.2: Ensure a value older than max_age is reported as stale.
+def test_price_stream_stale_value():
+    stream = PriceStream("wss://example.com/ws", MagicMock(), max_age=2.0)
+    stream._latest = (100.0, 62000.0)
+    with patch('exchange.utils.time.monotonic', return_value=103.0):
+        assert stream.latest() is None
+
+# Test 3.3: Ensure a failed connection is logged and the stream reconnects.
+def test_price_stream_reconnects_after_error(caplog):
+    ws = _FakeWebSocket(['{"p": "62000.0"}'])
+    stream = PriceStream("wss://example.com/ws", lambda message: float(message['p']), reconnect_delay=0.01)
+    with patch('exchange.utils.websocket.create_connection',
+               side_effect=[ConnectionRefusedError("Connection refused"), ws]) as mock_connect:
+        stream.start()
+        try:
+            assert _wait_for(lambda: stream.latest() == 62000.0)
+        finally:
+            stream.stop()
+    assert mock_connect.call_count == 2
+    assert caplog.records[0].getMessage() == "Error in price stream wss://example.com/ws: Connection refused"
+
+# Test 3.4: Ensure the heartbeat is sent while the stream is quiet.
+def test_price_stream_sends_heartbeat():
+    ws = _FakeWebSocket()
+    stream = PriceStream("wss://example.com/ws", MagicMock(), heartbeat={'op': 'ping'}, heartbeat_interval=0.01)
+    with patch('exchange.utils.websocket.create_connection', return_value=ws):
+        stream.start()
+        try:
+            assert _wait_for(lambda: {'op': 'ping'} in ws.sent)
+        finally:
+            stream.stop()
+
+# Test 3.5: Ensure messages the parser rejects leave the latest value untouched.
+def test_price_stream_ignores_unparsed_messages():
+    ws = _FakeWebSocket(['{"p": "62000.0"}', '{"op": "pong"}'])
+    received = threading.Semaphore(0)
+
+    def parse(message):
+        received.release()
+        return float(message['p']) if 'p' in message else None
+
+    stream = PriceStream("wss://example.com/ws", parse)
+    with patch('exchange.utils.websocket.create_connection', return_value=ws):
+        stream.start()
+        try:
+            assert received.acquire(timeout=1)
+            assert received.acquire(timeout=1)
+        finally:
+            stream.stop()
+    assert stream.latest() == 62000.0
+
+# --- TokenBucket Tests ---
+
+# Test 4.1: Ensure the bucket allows a burst and then refuses further tokens.
+def test_token_bucket_burst():
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        bucket = TokenBucket(rate=10, burst=3)
+        assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+# Test 4.2: Ensure tokens are refilled at the configured rate.
+def test_token_bucket_refill():
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        bucket = TokenBucket(rate=10, burst=1)
+        assert bucket.try_acquire()
+        assert not bucket.try_acquire()
+    with patch('exchange.utils.time.monotonic', return_value=100.5):
+        assert bucket.try_acquire()
+
+# Test 4.3: Ensure acquire blocks until a token is available instead of failing.
+def test_token_bucket_acquire_waits():
+    bucket = TokenBucket(rate=100, burst=1)
+    bucket.acquire()
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.005
+
+# --- CircuitBreaker Tests ---
+
+# Test 5.1: Ensure the breaker opens after fail_max consecutive failures and then rejects calls.
+def test_circuit_breaker_opens_after_failures():
+    breaker = CircuitBreaker(fail_max=3, reset_timeout=30)
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitBreakerError):
+        breaker.before_call()
+
+# Test 5.2: Ensure a success resets the count of consecutive failures.
+def test_circuit_breaker_success_resets_failures():
+    breaker = CircuitBreaker(fail_max=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+# Test 5.3: Ensure a single trial call is let through after reset_timeout and its success closes the breaker.
+def test_circuit_breaker_half_open_success():
+    breaker = CircuitBreaker(fail_max=1, reset_timeout=30)
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        breaker.record_failure()
+    with patch('exchange.utils.time.monotonic', return_value=130.0):
+        breaker.before_call()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        # Other calls keep failing fast while the trial is in flight
+        with pytest.raises(CircuitBreakerError):
+            breaker.before_call()
+        breaker.record_success()
+        breaker.before_call()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+# Test 5.4: Ensure a failed trial call re-opens the breaker for another reset_timeout.
+def test_circuit_breaker_half_open_failure():
+    breaker = CircuitBreaker(fail_max=1, reset_timeout=30)
+    with patch('exchange.utils.time.monotonic', return_value=100.0):
+        breaker.record_failure()
+    with patch('exchange.utils.time.monotonic', return_value=130.0):
+        breaker.before_call()
+        breaker.record_failure()
+    with patch('exchange.utils.time.monotonic', return_value=159.0):
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitBreakerError):
+            breaker.before_call()
+
+# --- build_session Tests ---
+
+# Test 6.1: Ensure order URLs and market-data URLs get separate connection pools and every request sends the headers.
+def test_build_session():
+    session, market_adapter, order_adapter = build_session("https://example.com", "/order", {'X-KEY': 'key'})
+    assert session.get_adapter("https://example.com/order/create") is order_adapter
+    assert session.get_adapter("https://example.com/ticker") is market_adapter
+    assert order_adapter is not market_adapter
+    # Both pools are bounded, and market-data bursts can use more connections than orders
+    assert order_adapter._pool_maxsize == 8
+    assert market_adapter._pool_maxsize == 32
+    assert session.headers['X-KEY'] == 'key'
+    session.close()
+
+# Test 6.2: Ensure a retried GET never sleeps for a Retry-After header longer than the capped backoff.
+def test_build_session_ignores_retry_after():
+    session, market_adapter, _ = build_session("https://example.com", "/order", {})
+    retry = market_adapter.max_retries
+    response = MagicMock(status=503, headers={'Retry-After': '3600'})
+    with patch('urllib3.util.retry.time.sleep') as mock_sleep:
+        retry.sleep(response)
+    assert all(call.args[0] <= retry.backoff_max for call in mock_sleep.call_args_list)
+    session.close()
+
+# Test 6.3: Ensure idempotent GETs are retried with jittered backoff on transient gateway errors but order POSTs are not.
+def test_build_session_retry_policy():
+    session, market_adapter, order_adapter = build_session("https://example.com", "/order", {})
+    for retry in (market_adapter.max_retries, order_adapter.max_retries):
+        assert retry.total == 2
+        assert set(retry.status_forcelist) == {502, 503, 504}
+        assert retry.backoff_jitter > 0
+        assert retry.backoff_max == 2.0
+        assert retry.is_retry('GET', 503)
+        assert not retry.is_retry('POST', 503)
+    session.close()
+
+# --- RequestTiming Tests ---
+
+class _Timed(RequestTiming):
+    def __init__(self, server_ms):
+        super().__init__()
+        self.fetch = MagicMock(return_value=server_ms)
+
+    def _fetch_server_time(self):
+        return self.fetch()
+
+# Test 7.1: Ensure sync_time measures the offset to the server clock from the middle of the round trip.
+def test_request_timing_sync_time():
+    timed = _Timed(server_ms=1700000000000)
+    with patch('exchange.utils.time.time_ns', side_effect=[5_000_000_000_000, 5_000_100_000_000, 5_000_200_000_000]):
+        timed.sync_time()
+        assert timed._timestamp() == 1700000000000 + 150
+
+# Test 7.2: Ensure taking a timestamp never requests the server time, so orders do not wait for a sync.
+def test_request_timing_timestamp_does_not_sync():
+    timed = _Timed(server_ms=1700000000000)
+    timed._timestamp()
+    timed.fetch.assert_not_called()
+
+# Test 7.3: Ensure start_time_sync measures the offset on a background thread and stop_time_sync ends the thread.
+def test_request_timing_background_sync():
+    timed = _Timed(server_ms=1700000000000)
+    timed.start_time_sync()
+    try:
+        deadline = time.monotonic() + 1
+        while timed._time_offset_ms == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert abs(timed._timestamp() - 1700000000000) < 1000
+    finally:
+        timed.stop_time_sync()
+    assert timed._time_sync_thread is None
+    timed.fetch.assert_called_once()
+
+# Test 7.4: Ensure a failed sync keeps the last offset and is retried after TIME_SYNC_RETRY_DELAY.
+def test_request_timing_sync_retry():
+    timed = _Timed(server_ms=1700000000000)
+    timed.TIME_SYNC_RETRY_DELAY = 0.01
+    timed.fetch.side_effect = [Exception("Time retrieval error"), 1700000000000]
+    timed.start_time_sync()
+    try:
+        deadline = time.monotonic() + 1
+        while timed.fetch.call_count < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        timed.stop_time_sync()
+    # The successful retry waits the full TIME_SYNC_INTERVAL before the next request
+    assert timed.fetch.call_count == 2
+
+# Test 7.5: Ensure timestamps follow the wall clock when it jumps (suspend, NTP step) between two syncs.
+def test_request_timing_follows_wall_clock():
+    timed = _Timed(server_ms=1700000000000)
+    with patch('exchange.utils.time.time_ns', return_value=1_600_000_000_000_000_000):
+        timed.sync_time()
+    with patch('exchange.utils.time.time_ns', return_value=1_600_003_600_000_000_000):
+        assert timed._timestamp() == 1700000000000 + 3_600_000
+
+# Test 7.6: Ensure request round trips are folded into the moving average.
+def test_request_timing_rtt_moving_average():
+    timed = _Timed(server_ms=1700000000000)
+    assert timed.rtt is None
+    timed._record_rtt(0.1)
+    assert timed.rtt == 0.1
+    timed._record_rtt(0.2)
+    assert timed.rtt == pytest.approx(0.1 + timed.RTT_SMOOTHING * 0.1)
+
+# --- ExchangeClient Tests ---
+
+class _Exchange(ExchangeClient):
+    NAME = 'Example'
+    PING_ENDPOINT = "/ping"
+
+    def __init__(self, base_url="https://example.com", timeout=(1.0, 3.0)):
+        self.BASE_URL = base_url
+        super().__init__(base_url, "/order", {'X-KEY': 'key'}, price_ttl=0, timeout=timeout)
+
+    def _fetch_server_time(self):
+        return self._send_request('GET', "/time")['serverTime']
+
+    def _send_request(self, method, endpoint, params=None):
+        return self._guarded_request(method, f"{self.BASE_URL}{endpoint}", params=params)
+
+    def place_order(self, symbol, side, quantity):
+        return self._send_request('POST', "/order", {'symbol': symbol, 'side': side, 'quantity': quantity})
+
+
+def _http_error(status_code, text):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = text
+    return requests.exceptions.HTTPError(response=response)
+
+# Test 8.1: Ensure each request is sent with the configured (connect, read) timeout and its round trip is measured.
+def test_exchange_client_request_timeout_and_rtt():
+    exchange = _Exchange(timeout=(0.5, 2.0))
+    with patch.object(exchange.session, 'request') as mock_request:
+        mock_request.return_value.json.return_value = {}
+        assert exchange._send_request('GET', "/ticker") == {}
+    assert mock_request.call_args[1]['timeout'] == (0.5, 2.0)
+    assert exchange.rtt is not None
+
+# Test 8.2: Ensure a server that never answers is reported as a timeout, both for a GET after its retries ran out
+# and for a POST, which is not retried.
+@pytest.mark.parametrize("method", ['GET', 'POST'])
+def test_exchange_client_read_timeout(hanging_server, caplog, method):
+    exchange = _Exchange(base_url=hanging_server, timeout=(1.0, 0.1))
+    # The retrying adapter is mounted for https only; the local server speaks plain http
+    exchange.session.mount('http://', exchange._market_adapter)
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        exchange._send_request(method, "/ping")
+    assert caplog.records[-1].getMessage() == "Request timed out for _send_request function"
+    exchange.session.close()
+
+# Test 8.3: Ensure consecutive timeouts open the circuit breaker so the next request fails without being sent.
+def test_exchange_client_breaker_opens_on_timeouts():
+    exchange = _Exchange()
+    with patch.object(exchange.session, 'request', side_effect=requests.exceptions.Timeout) as mock_request:
+        for _ in range(exchange.BREAKER_FAIL_MAX):
+            with pytest.raises(requests.exceptions.Timeout):
+                exchange._send_request('GET', "/ticker")
+        with pytest.raises(CircuitBreakerError):
+            exchange._send_request('GET', "/ticker")
+    assert mock_request.call_count == exchange.BREAKER_FAIL_MAX
+
+# Test 8.4: Ensure client errors such as 400 do not count as exchange failures.
+def test_exchange_client_breaker_ignores_client_errors():
+    exchange = _Exchange()
+    with patch.object(exchange.session, 'request', side_effect=_http_error(400, "Bad Request")) as mock_request:
+        for _ in range(exchange.BREAKER_FAIL_MAX + 1):
+            with pytest.raises(requests.exceptions.HTTPError):
+                exchange._send_request('GET', "/ticker")
+    assert mock_request.call_count == exchange.BREAKER_FAIL_MAX + 1
+
+# Test 8.5: Ensure orders awaited together with asyncio.gather are sent concurrently.
+def test_exchange_client_place_order_async_concurrent():
+    exchange = _Exchange()
+    # Each order waits until the other one has started, so this only completes if both run at the same time
+    barrier = threading.Barrier(2, timeout=1)
+
+    def place_order(symbol, side, quantity):
+        barrier.wait()
+        return {"symbol": symbol}
+
+    async def place_both():
+        return await asyncio.gather(
+            exchange.place_order_async("BTCUSDT", "BUY", 0.001),
+            exchange.place_order_async("ETHUSDT", "BUY", 0.01)
+        )
+
+    with patch.object(exchange, 'place_order', side_effect=place_order):
+        assert asyncio.run(place_both()) == [{"symbol": "BTCUSDT"}, {"symbol": "ETHUSDT"}]
+
+# Test 8.6: Ensure stop_tickers stops and forgets every price stream.
+def test_exchange_client_stop_tickers():
+    exchange = _Exchange()
+    ticker = MagicMock()
+    exchange._tickers['BTCUSDT'] = ticker
+
+    exchange.stop_tickers()
+
+    ticker.stop.assert_called_once()
+    assert exchange._tickers == {}